@@ -0,0 +1,189 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import NotFound
+
+from api.caching import (
+    JSON_VARIANT,
+    aget_version,
+    anonymous_cache_key,
+    cache_validators,
+    restore_response,
+    set_validators
+)
+from api.ingredient_index import ingredient_index
+from api.serializers import IngredientSerializer, TagSerializer
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from constants import INGREDIENT_SEARCH_LIMIT, REFERENCE_CACHE_TIMEOUT
+from recipes.models import Ingredient, Tag
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+ingredient_list_view = sync_to_async(
+    IngredientViewSet.as_view({'get': 'list'})
+)
+# Те же действия, что регистрирует для рецептов DefaultRouter
+recipe_list_view = sync_to_async(
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+recipe_detail_view = sync_to_async(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy'
+}))
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, safe=False, json_dumps_params=JSON_PARAMS
+    )
+
+
+async def conditional_reference(request, namespace, load):
+    """
+    Асинхронный аналог conditional_response: ETag и Last-Modified по
+    версии пространства имен. load — корутина, возвращающая ответ.
+    """
+    etag, last_modified, cache_key = cache_validators(
+        namespace,
+        await aget_version(namespace),
+        request.get_full_path(),
+        JSON_VARIANT
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = await load(cache_key)
+    return set_validators(response, etag, last_modified)
+
+
+async def cached_reference(request, namespace, load):
+    """
+    Асинхронный аналог VersionedCacheMixin: те же ключи кеша, ETag и
+    Last-Modified, поэтому ответы разделяются с синхронными вьюсетами.
+    load — корутина, возвращающая данные ответа или None (404).
+    """
+    async def cached_load(cache_key):
+        data = await cache.aget(cache_key)
+        if data is None:
+            data = await load()
+            if data is None:
+                return json_response(
+                    {'detail': str(NotFound.default_detail)}, status=404
+                )
+            await cache.aset(cache_key, data, REFERENCE_CACHE_TIMEOUT)
+        return json_response(data)
+
+    return await conditional_reference(request, namespace, cached_load)
+
+
+async def get_or_none(queryset, serializer_class, pk):
+    try:
+        return serializer_class(await queryset.aget(pk=pk)).data
+    except queryset.model.DoesNotExist:
+        return None
+
+
+async def tag_list(request):
+    async def load():
+        return TagSerializer(
+            [tag async for tag in Tag.objects.all()], many=True
+        ).data
+
+    return await cached_reference(request, TagViewSet.cache_namespace, load)
+
+
+async def tag_detail(request, pk):
+    return await cached_reference(
+        request,
+        TagViewSet.cache_namespace,
+        lambda: get_or_none(Tag.objects.all(), TagSerializer, pk)
+    )
+
+
+async def ingredient_list(request):
+    """
+    Полный список и поиск по ?name= через индекс в памяти. Остальные
+    параметры (?search=) обслуживает синхронный вьюсет.
+    """
+    if set(request.GET) - {'name'}:
+        return await ingredient_list_view(request)
+    name = request.GET.get('name')
+    if name:
+        async def search(cache_key):
+            # Первое обращение строит индекс запросом к БД
+            return json_response(await sync_to_async(
+                ingredient_index.search
+            )(name, INGREDIENT_SEARCH_LIMIT))
+
+        return await conditional_reference(
+            request, IngredientViewSet.cache_namespace, search
+        )
+
+    async def load():
+        return IngredientSerializer(
+            [ingredient async for ingredient in Ingredient.objects.all()],
+            many=True
+        ).data
+
+    return await cached_reference(
+        request, IngredientViewSet.cache_namespace, load
+    )
+
+
+async def ingredient_detail(request, pk):
+    return await cached_reference(
+        request,
+        IngredientViewSet.cache_namespace,
+        lambda: get_or_none(Ingredient.objects.all(), IngredientSerializer, pk)
+    )
+
+
+def is_anonymous_json(request):
+    """
+    Запрос без учетных данных, на который DRF ответит JSON: только
+    такие ответы кеширует AnonymousResponseCacheMixin.
+    """
+    accept = request.headers.get('Accept', '*/*')
+    return (
+        request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and request.GET.get('format', 'json') == 'json'
+        and 'text/html' not in accept
+        and ('application/json' in accept or '*/*' in accept)
+    )
+
+
+async def anonymous_cached(request, view, **kwargs):
+    """
+    Отдает закешированный ответ анониму без перехода в поток; промах,
+    запросы с учетными данными и записи обслуживает синхронный вьюсет,
+    который и наполняет кеш.
+    """
+    if is_anonymous_json(request):
+        namespace = RecipeViewSet.anonymous_cache_namespace
+        version_key = f'version:{namespace}'
+        key = anonymous_cache_key(namespace, request)
+        cached = await cache.aget_many((version_key, key))
+        if key in cached and cached[key][0] == cached.get(version_key):
+            return restore_response(cached[key])
+    return await view(request, **kwargs)
+
+
+async def recipe_list(request):
+    return await anonymous_cached(request, recipe_list_view)
+
+
+async def recipe_detail(request, pk):
+    return await anonymous_cached(request, recipe_detail_view, pk=pk)
+
+
+# Записи проверяет на CSRF SessionAuthentication внутри вьюсета, как и
+# при обычной маршрутизации DRF
+recipe_list.csrf_exempt = True
+recipe_detail.csrf_exempt = True
@@ -0,0 +1,228 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from constants import ANONYMOUS_CACHE_TIMEOUT, REFERENCE_CACHE_TIMEOUT
+
+
+def get_version(namespace):
+    """
+    Текущая версия данных пространства имен. Версия — момент последнего
+    изменения (unix time), поэтому она же служит Last-Modified.
+    """
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(namespace):
+    """Асинхронный вариант get_version."""
+    key = f'version:{namespace}'
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time(), None)
+        version = await cache.aget(key)
+    return version
+
+
+# Представление ответа асинхронных вьюх: они отвечают только JSON
+JSON_VARIANT = 'json:application/json'
+
+
+def response_variant(request):
+    """
+    Представление ответа DRF: рендерер и согласованный тип. Один адрес
+    отдает и JSON, и browsable API, поэтому ETag у них разный.
+    """
+    return f'{request.accepted_renderer.format}:{request.accepted_media_type}'
+
+
+def cache_validators(namespace, version, path, variant):
+    """
+    ETag, Last-Modified и ключ кеша данных ответа для версии, адреса
+    и представления. Данные от представления не зависят, ETag — да.
+    """
+    etag = quote_etag(
+        hashlib.md5(f'{version}:{path}:{variant}'.encode()).hexdigest()
+    )
+    return etag, int(version), f'{namespace}:{version}:{path}'
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def conditional_response(request, namespace, handler):
+    """
+    ETag и Last-Modified по версии пространства имен без кеширования
+    самого ответа: на условный запрос с актуальной версией отвечает 304,
+    не вызывая handler.
+    """
+    etag, last_modified, _ = cache_validators(
+        namespace,
+        get_version(namespace),
+        request.get_full_path(),
+        response_variant(request)
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = handler()
+    return set_validators(response, etag, last_modified)
+
+
+def bump_version(*namespaces):
+    """Сбрасывает все закешированные данные пространств имен."""
+    cache.set_many(
+        {f'version:{namespace}': time.time() for namespace in namespaces},
+        None
+    )
+
+
+def bump_version_on_commit(*namespaces):
+    """
+    Сбрасывает версии после фиксации транзакции: иначе параллельный
+    запрос успел бы закешировать старые данные под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(*namespaces))
+
+
+class VersionedCacheMixin:
+    """
+    Кеширует ответы list/retrieve справочных вьюсетов под ключом версии
+    пространства имен cache_namespace. Отдает ETag и Last-Modified и
+    отвечает 304 на условные запросы без обращения к БД.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        etag, last_modified, cache_key = cache_validators(
+            self.cache_namespace,
+            get_version(self.cache_namespace),
+            request.get_full_path(),
+            response_variant(request)
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            data = cache.get(cache_key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(cache_key, response.data, REFERENCE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        return set_validators(response, etag, last_modified)
+
+
+def anonymous_cache_key(namespace, request):
+    """
+    Ключ закешированного ответа анонимному пользователю. Принимает и
+    запрос Django, и запрос DRF: ключ совпадает для синхронных
+    вьюсетов и асинхронных вьюх.
+    """
+    params = sorted(
+        (name, sorted(filter(None, values)))
+        for name, values in request.GET.lists()
+    )
+    # Адреса в ответе (пагинация, изображения) абсолютные, поэтому
+    # в ключ входят схема и хост
+    digest = hashlib.md5(repr((
+        request.build_absolute_uri(request.path), params
+    )).encode()).hexdigest()
+    return f'{namespace}:anonymous:{digest}'
+
+
+def restore_response(entry):
+    """
+    Ответ из записи кеша анонимных ответов (версия, тело, заголовки):
+    заголовки сохраняются вместе с телом, чтобы попадание в кеш не
+    отличалось от промаха.
+    """
+    _, content, headers = entry
+    return HttpResponse(content, headers=headers)
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кеширует готовые JSON-ответы list/retrieve для анонимных
+    пользователей. Ключ строится из пути и нормализованных параметров
+    запроса. Версия пространства имен хранится рядом с ответом, поэтому
+    попадание в кеш стоит одного обращения (get_many). Страницы
+    browsable API не кешируются: в них встроен CSRF-токен посетителя.
+    """
+    anonymous_cache_namespace = None
+    anonymous_cache_timeout = ANONYMOUS_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def anonymous_cached_response(self, handler, request, *args, **kwargs):
+        if (
+            request.user.is_authenticated
+            or request.accepted_renderer.format != 'json'
+        ):
+            return handler(request, *args, **kwargs)
+        version_key = f'version:{self.anonymous_cache_namespace}'
+        key = anonymous_cache_key(self.anonymous_cache_namespace, request)
+        cached = cache.get_many((version_key, key))
+        version = cached.get(version_key)
+        if version is None:
+            version = get_version(self.anonymous_cache_namespace)
+        if key in cached and cached[key][0] == version:
+            return restore_response(cached[key])
+        request.anonymous_cache = (key, version)
+        return handler(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (
+            hasattr(request, 'anonymous_cache')
+            and response.status_code == status.HTTP_200_OK
+        ):
+            key, version = request.anonymous_cache
+            response.render()
+            cache.set(
+                key,
+                (version, response.content, dict(response.items())),
+                self.anonymous_cache_timeout
+            )
+        return response
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+
+
+@register()
+def check_shopping_list_font(app_configs, **kwargs):
+    """
+    Шрифт PDF-выгрузки списка покупок должен загружаться: без него
+    выгрузка в PDF невозможна, а встроенного шрифта с кириллицей нет.
+    """
+    try:
+        TTFont('ShoppingListCheck', settings.SHOPPING_LIST_FONT)
+    except (OSError, TTFError) as error:
+        return [Error(
+            f'Не удалось загрузить шрифт SHOPPING_LIST_FONT '
+            f'({settings.SHOPPING_LIST_FONT}): {error}',
+            hint=(
+                'Укажите в SHOPPING_LIST_FONT путь к TrueType-шрифту '
+                'с кириллицей или используйте fonts/DejaVuSans.ttf.'
+            ),
+            id='api.E001'
+        )]
+    return []
@@ -1,6 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Recipe, Tag, Ingredient
+from api.tag_slugs import tag_slug_choices, tag_slug_map
+from recipes.models import Recipe, Ingredient
+from recipes.search import search_recipes
 
 
 class IngredientFilter(FilterSet):
@@ -15,10 +18,9 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        method='filter_tags',
+        choices=tag_slug_choices
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited',
@@ -28,6 +30,14 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart',
         field_name='is_in_shopping_cart',
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'По числу добавлений в избранное'),
+            ('trending', 'Популярные за последнее время'),
+        ),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -35,17 +45,41 @@ class RecipeFilter(FilterSet):
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ordering'
         )
 
+    def filter_tags(self, queryset, name, value):
+        # EXISTS вместо JOIN: рецепт с несколькими подходящими тегами
+        # не дублируется, и DISTINCT не нужен. Карта могла перестроиться
+        # после проверки слагов, поэтому удаленные теги пропускаются.
+        slug_ids = tag_slug_map.get()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=[
+                    slug_ids[slug] for slug in value if slug in slug_ids
+                ]
+            )
+        ))
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(shoppinglists__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by('-favorites_count', '-pub_date')
+        return queryset.order_by('-trending_score', '-pub_date')
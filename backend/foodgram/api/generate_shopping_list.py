@@ -1,16 +1,136 @@
-def generate_shopping_list(ingredients_qs, shopping_list):
-    shopping_list_text = 'Вы выбрали следующие рецепты:\n\n'
-    for item in shopping_list:
-        shopping_list_text += f'- {item.recipe.name}\n'
-
-    shopping_list_text += '\nСписок покупок:\n\n'
-    for ingredient in ingredients_qs:
-        shopping_list_text += (
+import csv
+import hashlib
+import io
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.caching import get_version
+from constants import PDF_FONT_SIZE, PDF_LINE_HEIGHT, PDF_MARGIN
+
+PDF_FONT_NAME = 'ShoppingList'
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def generate_shopping_list(ingredients, recipe_names):
+    yield 'Вы выбрали следующие рецепты:\n\n'
+    for name in recipe_names:
+        yield f'- {name}\n'
+
+    yield '\nСписок покупок:\n\n'
+    for ingredient in ingredients:
+        yield (
             f'{ingredient["ingredient__name"]} '
             f'({ingredient["amount"]} '
             f'{ingredient["ingredient__measurement_unit"]})\n'
         )
 
-    shopping_list_text += '\nПриятного аппетита!'
+    yield '\nПриятного аппетита!'
+
+
+def generate_shopping_list_csv(ingredients, recipe_names):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Рецепт',))
+    for name in recipe_names:
+        yield writer.writerow((name,))
+
+    yield writer.writerow(())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единицы измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def generate_shopping_list_json(ingredients, recipe_names):
+    yield '{"recipes": '
+    yield json.dumps(list(recipe_names), ensure_ascii=False)
+    yield ', "ingredients": ['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(
+            {
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            },
+            ensure_ascii=False
+        )
+        separator = ', '
+    yield ']}'
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font():
+    """
+    Регистрирует в reportlab шрифт SHOPPING_LIST_FONT с кириллицей.
+    Недоступный шрифт — ошибка конфигурации, ее сообщает проверка
+    api.checks.check_shopping_list_font.
+    """
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_FONT)
+    )
+    return PDF_FONT_NAME
+
+
+def render_shopping_list_pdf(ingredients, recipe_names):
+    """
+    Верстает список покупок текстом на страницах A4 со встроенным
+    шрифтом и возвращает готовый PDF в виде байтов.
+    """
+    font = register_pdf_font()
+    width, height = A4
+    text = ''.join(generate_shopping_list(ingredients, recipe_names))
+    lines = []
+    for line in text.splitlines():
+        lines.extend(simpleSplit(
+            line, font, PDF_FONT_SIZE, width - 2 * PDF_MARGIN
+        ) or [''])
+
+    buffer = io.BytesIO()
+    # invariant: одинаковый список дает одинаковые байты
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=True)
+    pdf.setTitle('Список покупок')
+    lines_per_page = int((height - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT)
+    for start in range(0, len(lines), lines_per_page):
+        page = pdf.beginText(PDF_MARGIN, height - PDF_MARGIN)
+        page.setFont(font, PDF_FONT_SIZE, PDF_LINE_HEIGHT)
+        page.textLines(lines[start:start + lines_per_page])
+        pdf.drawText(page)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def shopping_list_cache_key(cart_versions, file_format):
+    """
+    Ключ кеша выгрузки: хеш набора рецептов корзины вместе с датами
+    их изменения и версией ингредиентов. Любая правка рецепта, корзины
+    или ингредиента (название, единицы измерения) меняет ключ.
+    """
+    digest = hashlib.sha256(repr((
+        sorted(cart_versions), get_version('ingredients')
+    )).encode()).hexdigest()
+    return f'shopping_list:{file_format}:{digest}'
+
 
-    return shopping_list_text
+# Формат выгрузки -> (генератор, content type)
+SHOPPING_LIST_FORMATS = {
+    'txt': (generate_shopping_list, 'text/plain; charset=utf-8'),
+    'csv': (generate_shopping_list_csv, 'text/csv; charset=utf-8'),
+    'json': (generate_shopping_list_json, 'application/json'),
+}
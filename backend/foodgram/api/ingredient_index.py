@@ -0,0 +1,68 @@
+import heapq
+import threading
+from bisect import bisect_left
+
+from api.caching import get_version
+from recipes.models import Ingredient
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса.
+    Отвечает на поиск по префиксу без обращения к БД. Перестраивается,
+    когда меняется версия пространства имен ingredients: ее сбрасывают
+    после фиксации транзакции сигналы и загрузка данных, поэтому
+    изменения подхватываются и другими процессами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda row: (row[1].lower(), row[0])
+        )
+        keys = [name.lower() for _, name, _ in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for pk, name, measurement_unit in rows
+        ]
+        return keys, items
+
+    def _get(self):
+        version = get_version('ingredients')
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._keys, self._items = self._build()
+                    self._version = version
+        return self._keys, self._items
+
+    def search(self, prefix, limit):
+        """
+        Ингредиенты, название которых начинается с prefix (без учета
+        регистра). Точное совпадение идет первым, затем более короткие
+        названия; выдача ограничена limit элементами.
+        """
+        keys, items = self._get()
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, lo=start)
+        return heapq.nsmallest(
+            limit,
+            items[start:end],
+            key=lambda item: (
+                item['name'].lower() != prefix,
+                len(item['name']),
+                item['name'].lower()
+            )
+        )
+
+
+ingredient_index = IngredientPrefixIndex()
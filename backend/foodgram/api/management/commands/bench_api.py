@@ -0,0 +1,60 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер эндпоинта API: запросы в секунду и задержки '
+        'при заданной конкурентности. Сервер должен быть уже запущен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:7000/api/recipes/',
+            help='Адрес, который нагружается GET-запросами'
+        )
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя для запросов с авторизацией'
+        )
+
+    def _request(self, url, headers):
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers)) as response:
+                response.read()
+                ok = response.status < 400
+        except OSError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        url = options['url']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                lambda _: self._request(url, headers),
+                range(options['requests'])
+            ))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'{len(results)} запросов, конкурентность '
+            f'{options["concurrency"]}: '
+            f'{len(results) / elapsed:.1f} rps, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} мс, '
+            f'p95 {p95 * 1000:.1f} мс, ошибок {errors}'
+        )
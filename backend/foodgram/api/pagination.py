@@ -1,8 +1,86 @@
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination as Cursor
 from rest_framework.pagination import PageNumberPagination as Pagination
+from rest_framework.response import Response
 
 from constants import PAGINATION_PAGE_SIZE
 
 
+def approximate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL (без COUNT(*)).
+    Для других СУБД оценка недоступна и возвращается None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return plan[0]['Plan']['Plan Rows']
+
+
 class PageNumberPagination(Pagination):
     page_size = PAGINATION_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class CursorPagination(Cursor):
+    """
+    Keyset-пагинация ленты рецептов по (pub_date, id): глубокие страницы
+    стоят столько же, сколько первая. Вместо точного count отдается
+    оценка планировщика. Курсор задает свою сортировку, поэтому
+    параметры другой сортировки (ordering_params) с ним не сочетаются:
+    по рейтингу или релевантности сплошной keyset-порядок не построить
+    (много равных значений, значения меняются между запросами).
+    """
+    page_size = PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    ordering_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        conflicting = [
+            param for param in self.ordering_params
+            if request.query_params.get(param)
+        ]
+        if conflicting:
+            raise ValidationError({
+                'pagination': (
+                    'Курсорная пагинация не сочетается с параметрами: '
+                    f'{", ".join(conflicting)}.'
+                )
+            })
+        self.count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class SubscriptionsCursorPagination(CursorPagination):
+    ordering = ('username',)
+
+
+class CursorPaginationMixin:
+    """
+    Переключает вьюсет на cursor_pagination_class по параметру
+    ?pagination=cursor; по умолчанию остается постраничная пагинация.
+    """
+    cursor_pagination_class = CursorPagination
+
+    @property
+    def paginator(self):
+        if (
+            not hasattr(self, '_paginator')
+            and self.request.query_params.get('pagination') == 'cursor'
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
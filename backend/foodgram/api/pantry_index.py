@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from django.db import connection, transaction
+
+from api.caching import bump_version_on_commit, get_version
+from constants import PANTRY_INDEX_REFRESH
+from recipes.models import RecipeIngredient
+
+Snapshot = namedtuple(
+    'Snapshot', ('ingredient_ids', 'starts', 'ends', 'recipe_ids', 'totals')
+)
+Match = namedtuple('Match', ('recipe_id', 'matched', 'total'))
+
+
+def build_snapshot():
+    """
+    Обратный индекс ингредиент -> рецепты: id рецептов, отсортированные
+    по ингредиенту, и границы отрезка каждого ингредиента. totals —
+    число ингредиентов каждого рецепта (индекс массива — id рецепта).
+    """
+    rows = RecipeIngredient.objects.order_by().values_list(
+        'ingredient_id', 'recipe_id'
+    )
+    pairs = np.fromiter(
+        chain.from_iterable(rows.iterator(chunk_size=10000)), dtype=np.int64
+    ).reshape(-1, 2)
+    pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+    ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    return Snapshot(
+        ingredient_ids=ingredient_ids,
+        starts=starts,
+        ends=np.append(starts[1:], len(pairs)),
+        # int32 вдвое сокращает память и объем данных, читаемых поиском
+        recipe_ids=pairs[:, 1].astype(np.int32),
+        totals=np.bincount(pairs[:, 1], minlength=1).astype(np.int32)
+    )
+
+
+class PantryIndex:
+    """
+    Обратный индекс ингредиентов рецептов в памяти процесса для поиска
+    рецептов по имеющимся продуктам. Изменения рецептов этого процесса
+    применяются сразу поверх снимка; при смене версии pantry (изменения
+    из других процессов и админки) снимок перестраивается в фоне не
+    чаще, чем раз в PANTRY_INDEX_REFRESH секунд.
+    """
+
+    def __init__(self, refresh=PANTRY_INDEX_REFRESH):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._built_at = 0
+        self._rebuilding = False
+        # recipe_id -> (номер изменения, множество id ингредиентов)
+        self._overrides = {}
+        self._sequence = 0
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Новый состав рецепта; применяется после фиксации транзакции."""
+        ingredient_ids = frozenset(ingredient_ids)
+        transaction.on_commit(
+            lambda: self._override(recipe_id, ingredient_ids)
+        )
+        bump_version_on_commit('pantry')
+
+    def _override(self, recipe_id, ingredient_ids):
+        with self._lock:
+            self._sequence += 1
+            self._overrides[recipe_id] = (self._sequence, ingredient_ids)
+
+    def _rebuild(self, version, close_connection=False):
+        """
+        Строит новый снимок. close_connection закрывает соединение с БД
+        после чтения: его передает только фоновый поток, запущенный _get,
+        соединение потока запроса остается под управлением Django.
+        """
+        with self._lock:
+            sequence = self._sequence
+        try:
+            snapshot = build_snapshot()
+        finally:
+            if close_connection:
+                connection.close()
+        with self._lock:
+            # Изменения, зафиксированные до начала чтения, уже в снимке
+            self._overrides = {
+                recipe_id: override
+                for recipe_id, override in self._overrides.items()
+                if override[0] > sequence
+            }
+            self._snapshot = snapshot
+            self._version = version
+            self._built_at = time.monotonic()
+            self._rebuilding = False
+
+    def _get(self):
+        version = get_version('pantry')
+        if self._snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    self._rebuild(version)
+        with self._lock:
+            stale = (
+                version != self._version
+                and not self._rebuilding
+                and time.monotonic() - self._built_at > self.refresh
+            )
+            if stale:
+                self._rebuilding = True
+            snapshot, overrides = self._snapshot, dict(self._overrides)
+        if stale:
+            threading.Thread(
+                target=self._rebuild, args=(version, True), daemon=True
+            ).start()
+        return snapshot, overrides
+
+    def search(self, ingredient_ids, limit):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов. Сначала
+        рецепты с наибольшей долей имеющихся ингредиентов, при равной
+        доле — с меньшим числом недостающих, затем более новые.
+        """
+        snapshot, overrides = self._get()
+        pantry = np.unique(np.asarray(list(ingredient_ids), dtype=np.int64))
+        positions = np.searchsorted(snapshot.ingredient_ids, pantry)
+        positions = positions[positions < len(snapshot.ingredient_ids)]
+        positions = positions[
+            np.isin(snapshot.ingredient_ids[positions], pantry)
+        ]
+        postings = [
+            snapshot.recipe_ids[snapshot.starts[i]:snapshot.ends[i]]
+            for i in positions
+        ]
+        matched = np.bincount(
+            np.concatenate(postings) if postings else np.empty(0, np.int64),
+            minlength=len(snapshot.totals)
+        )
+        # Рецепты с изменившимся составом считаются по их новому составу
+        changed = np.fromiter(overrides, dtype=np.int64)
+        matched[changed[changed < len(matched)]] = 0
+        recipe_ids = np.flatnonzero(matched)
+        matched_counts = matched[recipe_ids]
+        totals = snapshot.totals[recipe_ids]
+        pantry_set = set(pantry.tolist())
+        extra = [
+            (recipe_id, len(ingredients & pantry_set), len(ingredients))
+            for recipe_id, (_, ingredients) in overrides.items()
+            if ingredients & pantry_set
+        ]
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            recipe_ids = np.concatenate((recipe_ids, extra[:, 0]))
+            matched_counts = np.concatenate((matched_counts, extra[:, 1]))
+            totals = np.concatenate((totals, extra[:, 2]))
+        if not len(recipe_ids):
+            return []
+
+        coverage = matched_counts / totals
+        if len(coverage) > limit:
+            # Сортируются только кандидаты не хуже limit-го по доле
+            threshold = np.partition(coverage, len(coverage) - limit)[
+                len(coverage) - limit
+            ]
+            selected = np.flatnonzero(coverage >= threshold)
+        else:
+            selected = np.arange(len(coverage))
+        order = selected[np.lexsort((
+            -recipe_ids[selected],
+            totals[selected] - matched_counts[selected],
+            -coverage[selected]
+        ))][:limit]
+        return [
+            Match(int(recipe_ids[i]), int(matched_counts[i]), int(totals[i]))
+            for i in order
+        ]
+
+
+pantry_index = PantryIndex()
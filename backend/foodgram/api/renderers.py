@@ -0,0 +1,29 @@
+from rest_framework import renderers
+
+
+class PlainTextRenderer(renderers.BaseRenderer):
+    """
+    Рендерер для выгрузок в текстовом виде.
+    Сами файлы отдаются потоковым ответом, рендерер нужен для
+    согласования ?format= и отображения ошибок.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(PlainTextRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
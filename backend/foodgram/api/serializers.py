@@ -1,14 +1,24 @@
 import webcolors
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
 from django.db.transaction import atomic
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 
+from api.caching import get_version
+from api.pantry_index import pantry_index
 from constants import (
     MIN_COOKING_TIME,
     MAX_COOKING_TIME,
     MIN_AMOUNT,
-    MAX_AMOUNT
+    MAX_AMOUNT,
+    PANTRY_DEFAULT_LIMIT,
+    PANTRY_MAX_INGREDIENT_ID,
+    PANTRY_MAX_INGREDIENTS,
+    PANTRY_MAX_LIMIT,
+    RECIPE_FRAGMENT_CACHE_TIMEOUT
 )
+from recipes.images import thumbnail_urls
 from recipes.models import (
     Ingredient, Recipe,
     RecipeIngredient, Tag, ShoppingList, Favorite
@@ -30,6 +40,30 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
+def get_followed_author_ids(request):
+    """
+    Возвращает множество id авторов, на которых подписан пользователь.
+    Загружается одним запросом и кешируется на объекте запроса, чтобы
+    все сериализаторы ответа использовали один и тот же результат.
+    """
+    if not hasattr(request, 'followed_author_ids'):
+        request.followed_author_ids = set(
+            request.user.follower.values_list('author_id', flat=True)
+        )
+    return request.followed_author_ids
+
+
+def get_recipes_limit(request):
+    """Возвращает параметр recipes_limit из запроса или None."""
+    if not request or not hasattr(request, 'GET'):
+        return None
+    try:
+        recipes_limit = int(request.GET.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор модели User"""
     is_subscribed = serializers.SerializerMethodField()
@@ -46,7 +80,7 @@ class UserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
-            and request.user.follower.filter(author=obj).exists()
+            and obj.id in get_followed_author_ids(request)
         )
 
 
@@ -86,10 +120,11 @@ class RecipeIngredientDetailSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    """Сериализатор добавления ингредиентов в рецепт """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    """
+    Сериализатор добавления ингредиентов в рецепт. Существование
+    ингредиентов проверяется одним запросом в RecipeCreateSerializer.
+    """
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_AMOUNT,
         max_value=MAX_AMOUNT,
@@ -106,6 +141,59 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов из кеша представлений отдельных рецептов. Общая для
+    всех пользователей часть рецепта кешируется под ключом с датой его
+    изменения и загружается одним get_many на страницу. Теги и
+    ингредиенты подгружаются только для рецептов, которых нет в кеше,
+    а флаги пользователя накладываются поверх.
+    """
+
+    def fragment_key(self, recipe, prefix):
+        return f'{prefix}:{recipe.pk}:{recipe.modified.timestamp()}'
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        host = request.build_absolute_uri('/') if request else ''
+        prefix = f'recipe_fragment:{get_version("recipe_fragments")}:{host}'
+        keys = {
+            recipe.pk: self.fragment_key(recipe, prefix) for recipe in recipes
+        }
+        fragments = cache.get_many(keys.values())
+        missing = [
+            recipe for recipe in recipes if keys[recipe.pk] not in fragments
+        ]
+        if missing:
+            prefetch_related_objects(
+                missing, 'tags', 'recipe_ingredients__ingredient'
+            )
+            created = {
+                keys[recipe.pk]: self.child.to_representation(recipe)
+                for recipe in missing
+            }
+            cache.set_many(created, RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(created)
+
+        author_field = self.child.fields['author']
+        representation = []
+        for recipe in recipes:
+            item = dict(fragments[keys[recipe.pk]])
+            item['author'] = {
+                **item['author'],
+                'is_subscribed': author_field.get_is_subscribed(
+                    recipe.author
+                )
+            }
+            item['is_favorited'] = self.child.get_is_favorited(recipe)
+            item['is_in_shopping_cart'] = (
+                self.child.get_is_in_shopping_cart(recipe)
+            )
+            representation.append(item)
+        return representation
+
+
 class RecipeGetSerializer(serializers.ModelSerializer):
     """Сериализатор рецепта для GET запросов"""
     tags = TagSerializer(many=True, read_only=True)
@@ -121,6 +209,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         read_only=True
     )
+    thumbnails = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -133,11 +222,18 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'thumbnails',
             'text',
             'cooking_time',
         )
+        list_serializer_class = CachedRecipeListSerializer
+
+    def get_thumbnails(self, recipe):
+        return thumbnail_urls(recipe, self.context.get('request'))
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
@@ -145,6 +241,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
@@ -154,9 +252,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания/изменения рецепта"""
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(),
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
     ingredients = AddIngredientSerializer(many=True)
     cooking_time = serializers.IntegerField(
@@ -177,8 +273,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         # Проверка ингредиентов
+        # При PATCH непереданные ингредиенты и теги не меняются
         ingredients = data.get('ingredients')
-        if not ingredients:
+        if not ingredients and not self.omitted('ingredients', data):
             raise serializers.ValidationError(
                 {
                     'ingredients':
@@ -187,22 +284,45 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         # Проверка тегов
         tags = data.get('tags')
-        if not tags:
+        if not tags and not self.omitted('tags', data):
             raise serializers.ValidationError(
                 {'tags': 'Список тегов не может быть пустым.'}
             )
         # Проверка на уникальность ингредиентов и тегов
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients or ()]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 {'ingredients': 'Ингредиенты не могут повторяться.'}
             )
-        if len(set(tags)) != len(tags):
+        if tags and len(set(tags)) != len(tags):
             raise serializers.ValidationError(
                 {'tags': 'Теги не могут повторяться.'}
             )
+        # Все id проверяются одним запросом на модель, об отсутствующих
+        # сообщается сразу обо всех.
+        found = {}
+        errors = {}
+        for field, model, ids, name in (
+            ('ingredients', Ingredient, ingredient_ids, 'Ингредиенты'),
+            ('tags', Tag, tags or [], 'Теги'),
+        ):
+            found[field] = model.objects.in_bulk(ids) if ids else {}
+            missing = [str(pk) for pk in ids if pk not in found[field]]
+            if missing:
+                errors[field] = (
+                    f'{name} с id {", ".join(missing)} не существуют.'
+                )
+        if errors:
+            raise serializers.ValidationError(errors)
+        for ingredient in ingredients or ():
+            ingredient['id'] = found['ingredients'][ingredient['id']]
+        if tags:
+            data['tags'] = [found['tags'][tag] for tag in tags]
         return data
 
+    def omitted(self, field, data):
+        return self.partial and field not in data
+
     def validate_image(self, image):
         if not image:
             raise serializers.ValidationError(
@@ -222,13 +342,61 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @atomic
     def update(self, recipe, validate_data):
-        tags = validate_data.pop('tags')
-        ingredients = validate_data.pop('ingredients')
-        recipe.tags.set(tags)
-        recipe.recipe_ingredients.all().delete()
-        self.create_ingredients(ingredients, recipe)
+        tags = validate_data.pop('tags', None)
+        ingredients = validate_data.pop('ingredients', None)
+        # Используются теги и ингредиенты, предзагруженные вьюсетом
+        if tags is not None and set(tags) != set(recipe.tags.all()):
+            recipe.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(ingredients, recipe)
+        image = validate_data.get('image')
+        if image and self.is_same_image(recipe, image):
+            del validate_data['image']
         return super().update(recipe, validate_data)
 
+    @staticmethod
+    def is_same_image(recipe, image):
+        """Загружен ли тот же файл, что уже хранится у рецепта."""
+        field = recipe.image.field
+        return recipe.image.name == field.storage.hashed_name(
+            field.generate_filename(recipe, image.name), image
+        )
+
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданному списку: добавляет
+        новые, меняет количество у изменившихся и удаляет лишние.
+        """
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        ingredient_ids = set(amounts)
+        changed = []
+        removed = []
+        for recipe_ingredient in recipe.recipe_ingredients.all():
+            amount = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if amount is None:
+                removed.append(recipe_ingredient.pk)
+            elif amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if amounts:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                ) for ingredient_id, amount in amounts.items()
+            )
+        if removed or amounts:
+            pantry_index.update_recipe(recipe.pk, ingredient_ids)
+
     @staticmethod
     def create_ingredients(ingredients, recipe):
         ingredients = [
@@ -239,9 +407,18 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients
         ]
         RecipeIngredient.objects.bulk_create(ingredients)
+        pantry_index.update_recipe(
+            recipe.pk,
+            [ingredient.ingredient_id for ingredient in ingredients]
+        )
 
     def to_representation(self, recipe):
         request = self.context.get('request')
+        # После записи вьюсет сбрасывает предзагрузку: без нее
+        # ингредиенты ответа загружались бы по одному запросу на каждый.
+        prefetch_related_objects(
+            [recipe], 'tags', 'recipe_ingredients__ingredient'
+        )
         return RecipeGetSerializer(
             recipe, context={'request': request}
         ).data
@@ -252,9 +429,6 @@ class UserRecipesSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField(
         read_only=True
     )
-    recipes_count = serializers.SerializerMethodField(
-        read_only=True
-    )
 
     class Meta:
         model = User
@@ -270,28 +444,16 @@ class UserRecipesSerializer(UserSerializer):
         )
 
     def get_recipes(self, user):
-        request = self.context.get('request')
-        if request and hasattr(request, 'GET'):
-            recipes_limit = request.GET.get('recipes_limit')
-            try:
-                recipes_limit = int(recipes_limit)
-                if recipes_limit < 0:
-                    recipes_limit = None
-            except (TypeError, ValueError):
-                recipes_limit = None
+        if hasattr(user, 'recipes_preview'):
+            recipes_user = user.recipes_preview
         else:
-            recipes_limit = None
-        recipes_user = (user.recipes.all()[:recipes_limit]
-                        if recipes_limit else user.recipes.all())
-
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes_user = user.recipes.all()[:recipes_limit]
         return ShortRecipeSerializer(
             recipes_user,
             many=True
         ).data
 
-    def get_recipes_count(self, user):
-        return user.recipes.count()
-
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор сжатой версии рецепта"""
@@ -299,14 +461,97 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    thumbnails = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id',
                   'name',
                   'image',
+                  'thumbnails',
                   'cooking_time')
 
+    def get_thumbnails(self, recipe):
+        return thumbnail_urls(recipe, self.context.get('request'))
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(
+            min_value=1, max_value=PANTRY_MAX_INGREDIENT_ID
+        ),
+        min_length=1,
+        max_length=PANTRY_MAX_INGREDIENTS,
+        error_messages={
+            'min_length': 'Укажите хотя бы один ингредиент.',
+            'max_length': (
+                'Можно указать не более {max_length} ингредиентов.'
+            )
+        }
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=PANTRY_MAX_LIMIT,
+        default=PANTRY_DEFAULT_LIMIT
+    )
+
+    def to_internal_value(self, data):
+        # Принимаются и ?ingredients=1&ingredients=2, и ?ingredients=1,2
+        data = {
+            'ingredients': [
+                pk for value in data.getlist('ingredients')
+                for pk in value.split(',') if pk
+            ],
+            **({'limit': data['limit']} if 'limit' in data else {})
+        }
+        return super().to_internal_value(data)
+
+
+class PantryRecipeSerializer(ShortRecipeSerializer):
+    """
+    Рецепт в поиске по имеющимся ингредиентам: сколько ингредиентов
+    есть, сколько и каких не хватает. В контексте ожидается pantry —
+    множество id имеющихся ингредиентов.
+    """
+    matched_count = serializers.SerializerMethodField()
+    missing_count = serializers.SerializerMethodField()
+    coverage = serializers.SerializerMethodField()
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + (
+            'matched_count',
+            'missing_count',
+            'coverage',
+            'missing_ingredients'
+        )
+
+    def get_missing(self, recipe):
+        pantry = self.context['pantry']
+        return [
+            recipe_ingredient for recipe_ingredient
+            in recipe.recipe_ingredients.all()
+            if recipe_ingredient.ingredient_id not in pantry
+        ]
+
+    def get_matched_count(self, recipe):
+        return len(recipe.recipe_ingredients.all()) - len(
+            self.get_missing(recipe)
+        )
+
+    def get_missing_count(self, recipe):
+        return len(self.get_missing(recipe))
+
+    def get_coverage(self, recipe):
+        total = len(recipe.recipe_ingredients.all())
+        return round(self.get_matched_count(recipe) / total, 3) if total else 0
+
+    def get_missing_ingredients(self, recipe):
+        return RecipeIngredientDetailSerializer(
+            self.get_missing(recipe), many=True
+        ).data
+
 
 class FollowSerializer(serializers.ModelSerializer):
     class Meta:
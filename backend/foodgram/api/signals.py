@@ -0,0 +1,51 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.caching import bump_version_on_commit
+from api.pantry_index import pantry_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+# Поля пользователя, которые попадают в ответы о рецептах
+USER_PUBLIC_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    # Версия ingredients сбрасывает и кеш справочника, и индекс поиска
+    bump_version_on_commit('ingredients', 'recipes', 'recipe_fragments')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    # Версия tags сбрасывает и кеш справочника, и карту слагов
+    # фильтра рецептов
+    bump_version_on_commit('tags', 'recipes', 'recipe_fragments')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_pantry_index(instance, **kwargs):
+    pantry_index.update_recipe(instance.pk, ())
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_pantry(**kwargs):
+    # Сериализатор рецепта обновляет индекс сам; правки из админки
+    # подхватываются перестроением индекса по версии pantry
+    bump_version_on_commit('pantry')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: кеш не сбрасывается
+    if created:
+        return
+    if update_fields is None or USER_PUBLIC_FIELDS & set(update_fields):
+        bump_version_on_commit('recipes', 'recipe_fragments')
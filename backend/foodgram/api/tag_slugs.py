@@ -0,0 +1,33 @@
+import threading
+
+from api.caching import get_version
+from recipes.models import Tag
+
+
+class TagSlugMap:
+    """
+    Соответствие slug -> id тегов в памяти процесса. Перестраивается,
+    когда меняется версия пространства имен tags, поэтому изменения
+    тегов подхватываются и другими процессами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = {}
+
+    def get(self):
+        version = get_version('tags')
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list('slug', 'id'))
+                    self._version = version
+        return self._ids
+
+
+tag_slug_map = TagSlugMap()
+
+
+def tag_slug_choices():
+    return [(slug, slug) for slug in tag_slug_map.get()]
@@ -0,0 +1,921 @@
+import base64
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import async_views
+from api.caching import bump_version, get_version
+from api.checks import check_shopping_list_font
+from api.filters import RecipeFilter
+from api.pantry_index import PantryIndex, build_snapshot
+from api.tag_slugs import tag_slug_map
+from constants import TRENDING_WINDOW
+from recipes.models import (
+    Favorite, Ingredient,
+    Recipe, RecipeIngredient,
+    ShoppingList, SimilarRecipe, Tag
+)
+from recipes.search import index_recipes
+from recipes.trending import (
+    TRENDING_EVENTS,
+    event_weight,
+    refresh_trending_scores
+)
+from tasks.models import Task
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# Прозрачное изображение 1×1 в формате PNG
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeAPITestCase(TestCase):
+    """Общие данные: 12 рецептов с двумя тегами и тремя ингредиентами."""
+    RECIPES_COUNT = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password'
+        )
+        cls.author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password'
+        )
+        cls.recipes = []
+        for number in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                image=SimpleUploadedFile('image.png', PNG, 'image/png'),
+                text='Описание',
+                cooking_time=10
+            )
+            recipe.tags.set((
+                cls.tags[number % 3], cls.tags[(number + 1) % 3]
+            ))
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in cls.ingredients[number % 3:number % 3 + 3]
+            )
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingList.objects.create(user=cls.user, recipe=recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Ответы и представления рецептов кешируются между запросами
+        cache.clear()
+        self.anonymous_client = APIClient()
+        self.user_client = APIClient()
+        self.user_client.force_authenticate(self.user)
+
+
+class RecipeQueryCountTest(RecipeAPITestCase):
+    """Число запросов к БД не зависит от числа рецептов на странице."""
+    # Пользователю нужен еще запрос подписок для is_subscribed
+    LIST_QUERIES = {'anonymous_client': 5, 'user_client': 6}
+    RETRIEVE_QUERIES = {'anonymous_client': 4, 'user_client': 5}
+
+    def test_list_queries(self):
+        for client_name, queries in self.LIST_QUERIES.items():
+            for limit in (1, 6, self.RECIPES_COUNT):
+                with self.subTest(client=client_name, limit=limit):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        response = getattr(self, client_name).get(
+                            '/api/recipes/', {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve_queries(self):
+        for client_name, queries in self.RETRIEVE_QUERIES.items():
+            with self.subTest(client=client_name):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = getattr(self, client_name).get(
+                        f'/api/recipes/{self.recipes[0].pk}/'
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    def test_user_flags(self):
+        response = self.user_client.get(
+            '/api/recipes/', {'limit': self.RECIPES_COUNT}
+        )
+        favorited = {recipe.pk for recipe in self.recipes[::2]}
+        for recipe in response.data['results']:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in favorited
+            )
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in favorited
+            )
+
+
+class RecipeTagFilterTest(RecipeAPITestCase):
+    """
+    Фильтр по нескольким тегам: каждый рецепт с двумя тегами из трех,
+    поэтому при JOIN рецепты с обоими тегами запроса дублировались бы.
+    """
+    LIST_QUERIES = RecipeQueryCountTest.LIST_QUERIES['anonymous_client']
+
+    def matching(self, slugs):
+        return {
+            recipe.pk for recipe in self.recipes
+            if {tag.slug for tag in recipe.tags.all()} & set(slugs)
+        }
+
+    def test_count_without_duplicates(self):
+        for slugs in (['dinner'], ['breakfast', 'lunch'],
+                      ['breakfast', 'lunch', 'dinner']):
+            with self.subTest(slugs=slugs):
+                response = self.anonymous_client.get(
+                    '/api/recipes/',
+                    {'tags': slugs, 'limit': self.RECIPES_COUNT}
+                )
+                ids = [recipe['id'] for recipe in response.data['results']]
+                self.assertEqual(response.data['count'], len(ids))
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), self.matching(slugs))
+
+    def test_pages_do_not_repeat(self):
+        slugs = ['breakfast', 'lunch']
+        ids = []
+        for page in (1, 2, 3):
+            response = self.anonymous_client.get(
+                '/api/recipes/', {'tags': slugs, 'limit': 5, 'page': page}
+            )
+            ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.matching(slugs))
+
+    def test_no_tag_queries(self):
+        # Слаги проверяются по карте в памяти: запрос со слагами стоит
+        # столько же, сколько запрос без фильтра
+        tag_slug_map.get()
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.anonymous_client.get(
+                '/api/recipes/', {'tags': ['breakfast', 'lunch', 'dinner']}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_slug(self):
+        response = self.anonymous_client.get(
+            '/api/recipes/', {'tags': ['unknown']}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_tag_deleted_after_validation(self):
+        # Слаг прошел проверку по прежней карте, а тег уже удален
+        queryset = RecipeFilter().filter_tags(
+            Recipe.objects.all(), 'tags', ['deleted', 'dinner']
+        )
+        self.assertEqual(
+            {recipe.pk for recipe in queryset}, self.matching(['dinner'])
+        )
+        self.assertFalse(RecipeFilter().filter_tags(
+            Recipe.objects.all(), 'tags', ['deleted']
+        ).exists())
+
+    def test_filter_uses_exists(self):
+        queryset = RecipeFilter(
+            {'tags': ['breakfast', 'lunch']}, queryset=Recipe.objects.all()
+        ).qs
+        sql = str(queryset.query).upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('JOIN', sql)
+
+
+class ShoppingListPDFCacheTest(RecipeAPITestCase):
+    """Закешированный PDF списка покупок учитывает правки ингредиентов."""
+
+    def download(self):
+        return self.user_client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'pdf'}
+        ).content
+
+    def test_ingredient_rename_invalidates_pdf(self):
+        before = self.download()
+        self.assertEqual(before, self.download())
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = self.ingredients[0]
+            ingredient.name = 'Новое название'
+            ingredient.save()
+        self.assertNotEqual(before, self.download())
+
+    def test_text_pdf_with_embedded_font(self):
+        content = self.download()
+        self.assertTrue(content.startswith(b'%PDF'))
+        # Текст набран встроенным TrueType-шрифтом и извлекается
+        # (ToUnicode), а не нарисован растровым изображением
+        self.assertIn(b'/FontFile2', content)
+        self.assertIn(b'/ToUnicode', content)
+        self.assertNotIn(b'/Subtype /Image', content)
+
+    def test_font_check(self):
+        self.assertEqual(check_shopping_list_font(None), [])
+        with override_settings(SHOPPING_LIST_FONT='/nonexistent.ttf'):
+            errors = check_shopping_list_font(None)
+        self.assertEqual([error.id for error in errors], ['api.E001'])
+
+
+class IngredientSearchTest(RecipeAPITestCase):
+    """Поиск ингредиентов по префиксу подхватывает новую версию данных."""
+
+    def search(self, name):
+        response = self.anonymous_client.get(
+            '/api/ingredients/', {'name': name}
+        )
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_bulk_created_ingredient_is_found(self):
+        self.assertEqual(self.search('Соль'), [])
+        # Загрузка данных пишет bulk_create без сигналов и сама
+        # сбрасывает версию ingredients
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Соль', measurement_unit='г')]
+        )
+        bump_version('ingredients')
+        self.assertEqual(self.search('Соль'), ['Соль'])
+
+    def test_change_is_visible_after_commit(self):
+        self.search('Ингредиент')
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = self.ingredients[0]
+            ingredient.name = 'Перец'
+            ingredient.save()
+            # До фиксации транзакции индекс не перестраивается
+            self.assertEqual(self.search('Перец'), [])
+        self.assertEqual(self.search('Перец'), ['Перец'])
+
+    def test_search_conditional_request(self):
+        response = self.anonymous_client.get(
+            '/api/ingredients/', {'name': 'Ингредиент'}
+        )
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        response = self.anonymous_client.get(
+            '/api/ingredients/',
+            {'name': 'Ингредиент'},
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ReferenceValidatorsTest(RecipeAPITestCase):
+    """ETag справочников различается для разных представлений адреса."""
+
+    def test_etag_depends_on_renderer(self):
+        for path in ('/api/tags/', '/api/ingredients/?name=Ингр'):
+            with self.subTest(path=path):
+                json = self.anonymous_client.get(path)
+                browsable = self.anonymous_client.get(
+                    path, HTTP_ACCEPT='text/html'
+                )
+                self.assertEqual(browsable['Content-Type'][:9], 'text/html')
+                self.assertNotEqual(json['ETag'], browsable['ETag'])
+                for response in (json, browsable):
+                    self.assertIn('Accept', response['Vary'])
+                response = self.anonymous_client.get(
+                    path,
+                    HTTP_ACCEPT='text/html',
+                    HTTP_IF_NONE_MATCH=json['ETag']
+                )
+                self.assertEqual(response.status_code, 200)
+                response = self.anonymous_client.get(
+                    path, HTTP_IF_NONE_MATCH=json['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertIn('Accept', response['Vary'])
+
+
+class CursorPaginationTest(RecipeAPITestCase):
+    """Курсорная пагинация не теряет молча другую сортировку."""
+
+    def test_feed(self):
+        response = self.anonymous_client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 5}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.pk for recipe in self.recipes[::-1][:5]]
+        )
+
+    def test_other_ordering_is_rejected(self):
+        for params in ({'ordering': 'popular'}, {'search': 'Рецепт'}):
+            with self.subTest(params=params):
+                response = self.anonymous_client.get(
+                    '/api/recipes/', {'pagination': 'cursor', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.data)
+
+
+class AnonymousResponseCacheTest(RecipeAPITestCase):
+    """Анонимам кешируются только JSON-ответы."""
+
+    def test_json_is_cached(self):
+        self.anonymous_client.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            response = self.anonymous_client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hit_keeps_headers(self):
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipes[0].pk}/'):
+            with self.subTest(path=path):
+                miss = self.anonymous_client.get(path)
+                with self.assertNumQueries(0):
+                    hit = self.anonymous_client.get(path)
+                self.assertEqual(hit.content, miss.content)
+                self.assertEqual(dict(hit.items()), dict(miss.items()))
+                self.assertIn('Accept', hit['Vary'])
+                self.assertIn('Allow', hit)
+
+    def test_async_hit_keeps_headers(self):
+        miss = self.anonymous_client.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            hit = async_to_sync(async_views.recipe_list)(
+                AsyncRequestFactory().get('/api/recipes/')
+            )
+        self.assertEqual(hit.content, miss.content)
+        # Вьюха вызвана без middleware: сравниваются заголовки DRF
+        for header in ('Content-Type', 'Allow'):
+            self.assertEqual(hit[header], miss[header])
+        self.assertIn('Accept', hit['Vary'])
+
+    def test_browsable_api_is_not_cached(self):
+        tokens = []
+        for _ in range(2):
+            response = APIClient().get(
+                '/api/recipes/', HTTP_ACCEPT='text/html'
+            )
+            self.assertEqual(response.status_code, 200)
+            tokens.append(response.cookies['csrftoken'].value)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+
+class SimilarRecipesTest(RecipeAPITestCase):
+    """Похожие рецепты: команда build_similar_recipes и эндпоинт similar."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        call_command('build_similar_recipes', '--full', stdout=StringIO())
+
+    def similar(self, recipe):
+        response = self.anonymous_client.get(
+            f'/api/recipes/{recipe.pk}/similar/'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def test_unknown_recipe(self):
+        for pk in (0, 'abc'):
+            with self.subTest(pk=pk):
+                response = self.anonymous_client.get(
+                    f'/api/recipes/{pk}/similar/'
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_recipe_is_not_similar_to_itself(self):
+        for recipe in self.recipes:
+            with self.subTest(recipe=recipe.pk):
+                ids = self.similar(recipe)
+                self.assertTrue(ids)
+                self.assertNotIn(recipe.pk, ids)
+                self.assertEqual(len(ids), len(set(ids)))
+
+    def test_ordering(self):
+        recipe = self.recipes[0]
+        scores = list(SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('similar_id', 'score'))
+        self.assertEqual(
+            [score for _, score in scores],
+            sorted((score for _, score in scores), reverse=True)
+        )
+        ids = self.similar(recipe)
+        self.assertEqual(ids, [similar_id for similar_id, _ in scores])
+        # Рецепты с тем же составом и тегами — первые, при равном
+        # сходстве по возрастанию id
+        self.assertEqual(
+            ids[:3], [other.pk for other in self.recipes[3::3]]
+        )
+
+    def test_incremental_update(self):
+        recipe = self.recipes[0]
+        before = self.similar(recipe)
+        # Без изменений пересчитывать нечего
+        output = StringIO()
+        call_command('build_similar_recipes', stdout=output)
+        self.assertIn(' 0 ', output.getvalue())
+        other = self.recipes[1]
+        RecipeIngredient.objects.filter(recipe=other).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=other, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[:3]
+        )
+        other.tags.set(recipe.tags.all())
+        Recipe.objects.filter(pk=other.pk).update(modified=timezone.now())
+        call_command('build_similar_recipes', stdout=StringIO())
+        # Рецепт с тем же составом попадает в список и на первое место
+        # при меньшем id
+        self.assertEqual(self.similar(recipe)[0], other.pk)
+        self.assertNotEqual(self.similar(recipe), before)
+
+
+class PantryIndexTest(RecipeAPITestCase):
+    """
+    Поиск по имеющимся продуктам: изменения поверх снимка, перестроение
+    по версии pantry и порядок выдачи. У рецепта i ингредиенты
+    i % 3 .. i % 3 + 2.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.index = PantryIndex(refresh=60)
+
+    def ids(self, *numbers):
+        return [self.ingredients[number].pk for number in numbers]
+
+    def search(self, *numbers, limit=RecipeAPITestCase.RECIPES_COUNT):
+        return self.index.search(self.ids(*numbers), limit)
+
+    def update(self, recipe_id, *numbers):
+        # Изменения состава в БД здесь не пишутся, поэтому снимок
+        # строится поиском до первого изменения: иначе перестроение
+        # сочло бы изменение уже учтенным
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index.update_recipe(recipe_id, self.ids(*numbers))
+
+    def test_ranking(self):
+        matches = self.search(0, 1, 2)
+        # Сначала полное совпадение, затем 2/3 и 1/3; при равенстве —
+        # более новые рецепты
+        self.assertEqual(
+            [match.recipe_id for match in matches],
+            [recipe.pk for recipe in self.recipes[::-1][2::3]]
+            + [recipe.pk for recipe in self.recipes[::-1][1::3]]
+            + [recipe.pk for recipe in self.recipes[::-1][::3]]
+        )
+        self.assertEqual((matches[0].matched, matches[0].total), (3, 3))
+
+    def test_fewer_missing_wins_tie(self):
+        self.search(0)
+        older, newer = self.recipes[2], self.recipes[5]
+        self.update(older.pk, 0, 3)
+        self.update(newer.pk, 0, 1, 3, 4)
+        # Доля одинакова (1/2), но у старого рецепта не хватает одного
+        # ингредиента, у нового — двух
+        matches = [
+            match.recipe_id for match in self.search(0, 1)
+            if match.recipe_id in (older.pk, newer.pk)
+        ]
+        self.assertEqual(matches, [older.pk, newer.pk])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search(0, 1, 2, limit=3),
+            self.search(0, 1, 2)[:3]
+        )
+
+    def test_changes_between_rebuilds(self):
+        self.search(0)
+        created, edited, deleted = 10 ** 6, self.recipes[0], self.recipes[3]
+        self.update(created, 4)
+        self.update(edited.pk, 4)
+        self.update(deleted.pk)
+        found = {match.recipe_id: match for match in self.search(0, 4)}
+        self.assertEqual(found[created].total, 1)
+        self.assertEqual((found[edited.pk].matched, found[edited.pk].total),
+                         (1, 1))
+        self.assertNotIn(deleted.pk, found)
+        self.assertNotIn(
+            edited.pk, [match.recipe_id for match in self.search(0)]
+        )
+
+    def test_change_is_applied_after_commit(self):
+        self.search(0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index.update_recipe(self.recipes[0].pk, ())
+            self.assertIn(
+                self.recipes[0].pk,
+                [match.recipe_id for match in self.search(0)]
+            )
+        self.assertNotIn(
+            self.recipes[0].pk, [match.recipe_id for match in self.search(0)]
+        )
+
+    def test_stale_rebuild(self):
+        self.search(0)
+        with patch('api.pantry_index.threading.Thread') as thread:
+            self.update(self.recipes[0].pk, 4)
+            # Версия сменилась, но снимок моложе refresh секунд
+            self.search(0)
+            thread.assert_not_called()
+            self.index.refresh = 0
+            self.search(0)
+            self.search(0)
+        thread.assert_called_once_with(
+            target=self.index._rebuild,
+            args=(get_version('pantry'), True),
+            daemon=True
+        )
+
+    def test_rebuild_keeps_newer_changes(self):
+        self.search(0)
+        RecipeIngredient.objects.filter(recipe=self.recipes[0]).delete()
+        self.update(self.recipes[0].pk)
+        later = self.recipes[3]
+
+        def build_during_change():
+            # Изменение, зафиксированное во время чтения снимка, в снимок
+            # могло не попасть и должно остаться поверх него
+            snapshot = build_snapshot()
+            self.update(later.pk)
+            return snapshot
+
+        with patch(
+            'api.pantry_index.build_snapshot', side_effect=build_during_change
+        ):
+            self.index._rebuild(get_version('pantry'))
+        self.assertEqual(list(self.index._overrides), [later.pk])
+        found = [match.recipe_id for match in self.search(0)]
+        self.assertNotIn(self.recipes[0].pk, found)
+        self.assertNotIn(later.pk, found)
+
+    def test_query_validation(self):
+        for value in ('99999999999999999999', '0', 'x'):
+            with self.subTest(value=value):
+                response = self.anonymous_client.get(
+                    '/api/recipes/pantry/', {'ingredients': value}
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+class TrendingScoreTest(RecipeAPITestCase):
+    """Рейтинг популярности: пересчет в БД и отмена событий."""
+
+    def expected_scores(self):
+        since = timezone.now() - timedelta(seconds=TRENDING_WINDOW)
+        scores = {recipe.pk: 0 for recipe in self.recipes}
+        for model, weight in TRENDING_EVENTS:
+            for event in model.objects.filter(created__gte=since):
+                scores[event.recipe_id] += event_weight(event.created, weight)
+        return scores
+
+    def assertScores(self, expected):
+        scores = dict(Recipe.objects.values_list('pk', 'trending_score'))
+        for pk, score in expected.items():
+            self.assertAlmostEqual(scores[pk], score, delta=score * 1e-9)
+
+    def test_refresh_matches_event_weights(self):
+        Favorite.objects.filter(recipe=self.recipes[0]).update(
+            created=timezone.now() - timedelta(seconds=TRENDING_WINDOW + 1)
+        )
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            trending_score=100
+        )
+        self.assertEqual(
+            refresh_trending_scores(), len(self.recipes[::2]) + 1
+        )
+        self.assertScores(self.expected_scores())
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[1].pk).trending_score, 0
+        )
+
+    def test_removing_old_event_keeps_score(self):
+        recipe = self.recipes[0]
+        Favorite.objects.filter(recipe=recipe).update(
+            created=timezone.now() - timedelta(seconds=TRENDING_WINDOW + 1)
+        )
+        refresh_trending_scores()
+        score = Recipe.objects.get(pk=recipe.pk).trending_score
+        self.assertGreater(score, 0)
+        response = self.user_client.delete(
+            f'/api/recipes/{recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).trending_score, score
+        )
+        # Событие в окне вычитается
+        self.user_client.delete(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertAlmostEqual(
+            Recipe.objects.get(pk=recipe.pk).trending_score,
+            0,
+            delta=score * 1e-9
+        )
+
+
+class SearchIndexTest(RecipeAPITestCase):
+    """Полнотекстовый индекс рецептов."""
+
+    def search(self, query):
+        response = self.anonymous_client.get(
+            '/api/recipes/', {'search': query, 'limit': self.RECIPES_COUNT}
+        )
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_ingredient_rename_reindexes_recipes(self):
+        ingredient = self.ingredients[4]
+        recipes = {
+            item.recipe_id for item in ingredient.recipe_ingredients.all()
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Шафран'
+            ingredient.save()
+        self.assertEqual(self.search('шафран'), recipes)
+
+    def test_queries_do_not_depend_on_recipes_count(self):
+        queries = []
+        for recipes in (self.recipes[:1], self.recipes):
+            with CaptureQueriesContext(connection) as context:
+                index_recipes(Recipe, [recipe.pk for recipe in recipes])
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(self.search('Рецепт'), {
+            recipe.pk for recipe in self.recipes
+        })
+
+
+class CounterClampTest(RecipeAPITestCase):
+    """Разошедшиеся счетчики не уходят ниже нуля при уменьшении."""
+
+    def test_unfavorite_with_zero_counters(self):
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=0, in_carts_count=0, trending_score=0
+        )
+        for endpoint in ('favorite', 'shopping_cart'):
+            with self.subTest(endpoint=endpoint):
+                response = self.user_client.delete(
+                    f'/api/recipes/{recipe.pk}/{endpoint}/'
+                )
+                self.assertEqual(response.status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count,
+             recipe.trending_score),
+            (0, 0, 0)
+        )
+
+    def test_unsubscribe_with_zero_counter(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(self.user_client.post(url).status_code, 201)
+        User.objects.filter(pk=self.author.pk).update(followers_count=0)
+        self.assertEqual(self.user_client.delete(url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+
+@override_settings(TASKS_EAGER=True)
+class RecipeImageTest(RecipeAPITestCase):
+    """Обработка загруженного изображения рецепта в фоне."""
+
+    def test_uploaded_image_url_stays_valid(self):
+        # Другое изображение: одинаковые загрузки хранятся в одном файле
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), (255, 0, 0)).save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            client = APIClient()
+            client.force_authenticate(self.author)
+            response = client.post('/api/recipes/', {
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': [self.tags[0].pk],
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 10}
+                ],
+                'image': 'data:image/png;base64,'
+                         + base64.b64encode(buffer.getvalue()).decode()
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        uploaded = response.data['image'].split(settings.MEDIA_URL, 1)[1]
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertTrue(recipe.has_thumbnails)
+        self.assertNotEqual(recipe.image.name, uploaded)
+        # Адрес из ответа работает, пока файл не соберет gc_media
+        self.assertTrue(default_storage.exists(uploaded))
+        call_command('gc_media', '--grace', '0', stdout=StringIO())
+        self.assertFalse(default_storage.exists(uploaded))
+        self.assertTrue(default_storage.exists(recipe.image.name))
+
+
+class SubscriptionsQueryCountTest(RecipeAPITestCase):
+    """Страница подписок: число запросов не зависит от числа авторов."""
+    QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = []
+        for number in range(7):
+            author = User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password'
+            )
+            for recipe_number in range(3):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {number}-{recipe_number}',
+                    image=cls.recipes[0].image.name,
+                    text='Описание',
+                    cooking_time=10
+                )
+            cls.authors.append(author)
+
+    def test_subscriptions_queries(self):
+        for count in (1, 3, 7):
+            with self.subTest(count=count):
+                Follow.objects.filter(user=self.user).delete()
+                Follow.objects.bulk_create(
+                    Follow(user=self.user, author=author)
+                    for author in self.authors[:count]
+                )
+                with self.assertNumQueries(self.QUERIES):
+                    response = self.user_client.get(
+                        '/api/users/subscriptions/',
+                        {'recipes_limit': 2, 'limit': 10}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), count)
+                for author in response.data['results']:
+                    self.assertEqual(len(author['recipes']), 2)
+                    self.assertEqual(author['recipes_count'], 3)
+
+
+class RecipeWriteQueryCountTest(RecipeAPITestCase):
+    """
+    Создание и изменение рецепта: число запросов не зависит от числа
+    ингредиентов.
+    """
+    CREATE_QUERIES = 17
+    UPDATE_QUERIES = 21
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.products = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Продукт {number}', measurement_unit='г')
+            for number in range(60)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def payload(self, name, ingredients, tags):
+        return {
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 5,
+            'tags': [tag.pk for tag in tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in ingredients
+            ],
+            'image': 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+        }
+
+    def test_write_queries(self):
+        for count in (1, 5, 30):
+            with self.subTest(count=count):
+                with self.assertNumQueries(self.CREATE_QUERIES):
+                    response = self.author_client.post(
+                        '/api/recipes/',
+                        self.payload(
+                            f'Новый рецепт {count}',
+                            self.products[:count],
+                            self.tags[:1]
+                        ),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                # Все ингредиенты и теги заменяются другими
+                with self.assertNumQueries(self.UPDATE_QUERIES):
+                    response = self.author_client.put(
+                        f'/api/recipes/{response.data["id"]}/',
+                        self.payload(
+                            f'Измененный рецепт {count}',
+                            self.products[count:2 * count],
+                            self.tags[1:]
+                        ),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.data['ingredients']), count
+                )
+
+
+class RecipeUpdateDiffTest(RecipeAPITestCase):
+    """Изменение рецепта переписывает только изменившиеся данные."""
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        self.recipe = self.recipes[0]
+
+    def put(self, amount=100):
+        return self.author_client.put(f'/api/recipes/{self.recipe.pk}/', {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [tag.pk for tag in self.recipe.tags.all()],
+            'ingredients': [
+                {'id': item.ingredient_id, 'amount': amount}
+                for item in self.recipe.recipe_ingredients.all()
+            ],
+            'image': 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+        }, format='json')
+
+    def rows(self):
+        return (
+            set(RecipeIngredient.objects.filter(
+                recipe=self.recipe
+            ).values_list('pk', 'ingredient_id', 'amount')),
+            set(Recipe.tags.through.objects.filter(
+                recipe=self.recipe
+            ).values_list('pk', 'tag_id'))
+        )
+
+    def test_unchanged_put_rewrites_nothing(self):
+        image = self.recipe.image.name
+        modified = os.stat(default_storage.path(image)).st_mtime_ns
+        rows = self.rows()
+        tasks = Task.objects.count()
+        response = self.put()
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertEqual(
+            os.stat(default_storage.path(image)).st_mtime_ns, modified
+        )
+        # Изображение не меняется — обработка не ставится в очередь
+        self.assertEqual(Task.objects.count(), tasks)
+        self.assertEqual(self.rows(), rows)
+
+    def test_changed_amount_keeps_rows(self):
+        ingredient_rows, tag_rows = self.rows()
+        self.assertEqual(self.put(amount=50).status_code, 200)
+        self.assertEqual(self.rows(), (
+            {(pk, ingredient_id, 50)
+             for pk, ingredient_id, _ in ingredient_rows},
+            tag_rows
+        ))
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -16,3 +17,18 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_API:
+    from api import async_views
+
+    # В ASGI-режиме справочники и попадания в кеш ответов рецептов для
+    # анонимов обслуживаются асинхронными вьюхами, остальное — вьюсетами
+    # DRF в потоках.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+    ] + urlpatterns
@@ -1,5 +1,7 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import Exists, OuterRef, Prefetch, Sum, Value
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as django_filters
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import viewsets, status
@@ -10,24 +12,43 @@ from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from api import serializers
+from api.caching import (
+    AnonymousResponseCacheMixin,
+    VersionedCacheMixin,
+    conditional_response
+)
 from api.filters import IngredientFilter, RecipeFilter
-from api.generate_shopping_list import generate_shopping_list
-from api.pagination import PageNumberPagination
+from api.generate_shopping_list import (
+    SHOPPING_LIST_FORMATS,
+    render_shopping_list_pdf,
+    shopping_list_cache_key
+)
+from api.ingredient_index import ingredient_index
+from api.pantry_index import pantry_index
+from api.pagination import (
+    CursorPaginationMixin,
+    PageNumberPagination,
+    SubscriptionsCursorPagination
+)
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from constants import INGREDIENT_SEARCH_LIMIT, SHOPPING_LIST_CACHE_TIMEOUT
 from recipes.models import (
     Favorite, Ingredient,
     Recipe, ShoppingList,
-    Tag, RecipeIngredient
+    SimilarRecipe, Tag, RecipeIngredient
 )
 from users.models import Follow, User
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(CursorPaginationMixin, DjoserUserViewSet):
     """Вьюсет для модели User"""
     pagination_class = PageNumberPagination
+    cursor_pagination_class = SubscriptionsCursorPagination
 
     def get_permissions(self):
         if self.action == 'me':
@@ -41,8 +62,15 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         """Метод для получения списка подписок"""
+        recipes_limit = serializers.get_recipes_limit(request)
         authors = User.objects.filter(
             following__user=request.user
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.all()[:recipes_limit],
+                to_attr='recipes_preview'
+            )
         )
         page = self.paginate_queryset(authors)
         serializer = serializers.UserRecipesSerializer(
@@ -92,15 +120,17 @@ class UserViewSet(DjoserUserViewSet):
         )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Tag"""
+    cache_namespace = 'tags'
     permission_classes = (AllowAny,)
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Ingredient"""
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
     permission_classes = (AllowAny,)
@@ -111,9 +141,33 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по ?name= обслуживается индексом в памяти процесса:
+        без запросов к БД, с ранжированием и ограничением выдачи.
+        Ответ не кешируется, но получает ETag и Last-Modified по версии
+        ингредиентов, как и полный список.
+        """
+        name = request.query_params.get('name')
+        if name:
+            return conditional_response(
+                request,
+                self.cache_namespace,
+                lambda: Response(
+                    ingredient_index.search(name, INGREDIENT_SEARCH_LIMIT)
+                )
+            )
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    AnonymousResponseCacheMixin,
+    CursorPaginationMixin,
+    viewsets.ModelViewSet
+):
     """Вьюсет для модели Recipe"""
+    anonymous_cache_namespace = 'recipes'
+    lookup_value_regex = r'\d+'
     permission_classes = (
         IsAuthorOrReadOnly,
         IsAuthenticatedOrReadOnly
@@ -129,12 +183,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (django_filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """
+        Аннотирует рецепты флагами is_favorited и is_in_shopping_cart,
+        чтобы сериализатор не делал отдельных запросов на каждый рецепт.
+        """
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Теги и ингредиенты списка берутся из кеша представлений,
+            # недостающие подгружает CachedRecipeListSerializer.
+            queryset = queryset.prefetch_related(None)
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
     def get_serializer_class(self):
         """Получение сериализатора в зависимости от запроса"""
         if self.action in ('list', 'retrieve'):
             return serializers.RecipeGetSerializer
         return serializers.RecipeCreateSerializer
 
+    @action(detail=False, methods=['GET'])
+    def pantry(self, request):
+        """
+        Что можно приготовить: рецепты по имеющимся ингредиентам
+        (?ingredients=1,2,3), отсортированные по доле имеющихся
+        ингредиентов и числу недостающих. Кандидаты ранжируются
+        обратным индексом в памяти, из БД загружаются только
+        попавшие в выдачу рецепты.
+        """
+        query = serializers.PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        pantry = set(query.validated_data['ingredients'])
+        matches = pantry_index.search(pantry, query.validated_data['limit'])
+        recipes = Recipe.objects.prefetch_related(Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )).in_bulk([match.recipe_id for match in matches])
+        return Response(serializers.PantryRecipeSerializer(
+            [
+                recipes[match.recipe_id] for match in matches
+                if match.recipe_id in recipes
+            ],
+            many=True,
+            context={'request': request, 'pantry': pantry}
+        ).data)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по ингредиентам и тегам. Списки заранее строит
+        команда build_similar_recipes, здесь они читаются одним
+        запросом по индексу.
+        """
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        similar = [
+            item.similar for item in SimilarRecipe.objects.filter(
+                recipe=recipe
+            ).select_related('similar')
+        ]
+        return Response(serializers.ShortRecipeSerializer(
+            similar, many=True, context={'request': request}
+        ).data)
+
     @staticmethod
     def create_item(serializer_class, request, pk):
         user = request.user
@@ -176,9 +298,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['GET'],
-        url_path='download_shopping_cart'
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PlainTextRenderer, CSVRenderer, JSONRenderer, PDFRenderer
+        )
     )
     def download_shopping_cart(self, request, **kwargs):
+        """
+        Потоковая выгрузка списка покупок.
+        Формат выбирается параметром ?format= (txt, csv, json, pdf).
+        """
+        file_format = request.accepted_renderer.format
+        if file_format == PDFRenderer.format:
+            response = self.shopping_cart_pdf(request)
+        else:
+            generator, content_type = SHOPPING_LIST_FORMATS[file_format]
+            response = StreamingHttpResponse(
+                generator(*self.shopping_cart_data(request)),
+                content_type=content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
+        )
+        return response
+
+    @staticmethod
+    def shopping_cart_data(request):
+        """Агрегированные ингредиенты и названия рецептов корзины"""
+        recipe_names = request.user.shoppinglists.values_list(
+            'recipe__name', flat=True
+        )
         ingredients_qs = RecipeIngredient.objects.filter(
             recipe__shoppinglists__user=request.user
         ).values(
@@ -187,20 +337,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ).annotate(
             amount=Sum('amount')
         ).order_by('ingredient__name')
+        return ingredients_qs.iterator(), recipe_names
 
-        shopping_list_text = generate_shopping_list(
-            ingredients_qs,
-            request.user.shoppinglists.all()
-        )
-
-        response = FileResponse(
-            shopping_list_text,
-            as_attachment=True,
-            filename='shopping_cart.txt',
-            content_type='text/plain'
+    def shopping_cart_pdf(self, request):
+        """
+        PDF-версия списка покупок. Готовый файл кешируется по составу
+        корзины, поэтому повторная выгрузка неизменной корзины не делает
+        ни агрегирующего запроса, ни отрисовки.
+        """
+        cache_key = shopping_list_cache_key(
+            request.user.shoppinglists.values_list(
+                'recipe_id', 'recipe__modified'
+            ),
+            PDFRenderer.format
         )
-
-        return response
+        content = cache.get(cache_key)
+        if content is None:
+            content = render_shopping_list_pdf(
+                *self.shopping_cart_data(request)
+            )
+            cache.set(cache_key, content, SHOPPING_LIST_CACHE_TIMEOUT)
+        return HttpResponse(content, content_type=PDFRenderer.media_type)
 
     @action(
         detail=True,
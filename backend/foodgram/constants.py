@@ -17,3 +17,55 @@ MIN_AMOUNT = 1
 MAX_AMOUNT = 10000
 # Дефолтный лимит рецептов
 DEFAULT_RECIPES_LIMIT = 3
+# Константы PDF-выгрузки списка покупок (A4, размеры в пунктах)
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+# Константы поиска ингредиентов
+INGREDIENT_SEARCH_LIMIT = 20
+# Время жизни закешированных справочников (теги, ингредиенты)
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+# Время жизни закешированных ответов рецептов для анонимов: ограничивает
+# устаревание сортировок по популярности, счетчики не сбрасывают кеш
+ANONYMOUS_CACHE_TIMEOUT = 60
+# Время жизни закешированного представления отдельного рецепта
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+# Константы сортировки по популярности за последнее время.
+# Вес события растет вдвое каждые TRENDING_HALF_LIFE секунд от
+# TRENDING_EPOCH: это эквивалентно экспоненциальному затуханию старых
+# событий, но позволяет наращивать рейтинг инкрементально. Точности
+# float хватает примерно на 19 лет от TRENDING_EPOCH.
+TRENDING_EPOCH = 1767225600  # 2026-01-01 00:00 UTC
+TRENDING_HALF_LIFE = 60 * 60 * 24 * 7
+TRENDING_WINDOW = 60 * 60 * 24 * 30
+TRENDING_FAVORITE_WEIGHT = 2
+TRENDING_CART_WEIGHT = 1
+# Константы обработки изображений рецептов
+RECIPE_IMAGE_MAX_SIZE = 1600
+RECIPE_IMAGE_QUALITY = 82
+RECIPE_THUMBNAIL_SIZES = {
+    'small': 320,
+    'medium': 640,
+}
+# Константы очереди фоновых задач
+MAX_LENGTH_TASK_NAME = 200
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_LEASE = 60 * 10
+# Константы поиска рецептов по имеющимся ингредиентам
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_DEFAULT_LIMIT = 20
+PANTRY_MAX_LIMIT = 100
+PANTRY_INDEX_REFRESH = 60 * 5
+# Наибольший id ингредиента: BigAutoField и int64 индекса
+PANTRY_MAX_INGREDIENT_ID = 2 ** 63 - 1
+# Константы похожих рецептов
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_TAG_WEIGHT = 0.5
+# Ингредиенты, которые есть у большей доли рецептов (но не меньше чем
+# у SIMILAR_MIN_PRUNED рецептов), не учитываются при поиске похожих
+SIMILAR_MAX_SHARE = 0.1
+SIMILAR_MIN_PRUNED = 1000
+# Ограничение размера матрицы сходства одной пачки рецептов
+SIMILAR_CHUNK_PAIRS = 5000000
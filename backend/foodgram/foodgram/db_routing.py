@@ -0,0 +1,113 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+use_replica = ContextVar('use_replica', default=False)
+# Модели, которые всегда читаются с основной БД: токен, выданный при
+# входе, должен сразу работать, даже если реплика еще отстает
+PRIMARY_ONLY_MODELS = {'authtoken.token'}
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение на реплики, если его разрешил
+    ReplicaRoutingMiddleware; все записи и миграции идут в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            settings.REPLICA_DATABASES
+            and use_replica.get()
+            and model._meta.label_lower not in PRIMARY_ONLY_MODELS
+        ):
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def sticky_key(request):
+    """
+    Ключ привязки клиента к основной БД: по токену или сессии, чтобы
+    работало и до аутентификации внутри DRF.
+    """
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'db-sticky:{digest}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик безопасным запросам к API. После записи
+    клиент на REPLICA_STICKINESS секунд читает с основной БД, чтобы
+    видеть свои изменения несмотря на задержку репликации.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        key, token = self.route(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.stick(request, key, response)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        key, token = self.route(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.stick(request, key, response)
+        return response
+
+    def route(self, request):
+        key = sticky_key(request)
+        token = use_replica.set(
+            request.method in SAFE_METHODS
+            and request.path.startswith('/api/')
+            and not (key and cache.get(key))
+        )
+        return key, token
+
+    def stick(self, request, key, response):
+        if (
+            request.method not in SAFE_METHODS
+            and key
+            and response.status_code < 400
+        ):
+            cache.set(key, True, settings.REPLICA_STICKINESS)
@@ -13,6 +13,10 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'secret_key_name')
 
 DEBUG = os.getenv('DEBUG')
 
+# Асинхронный режим: приложение запускается через ASGI (uvicorn-воркеры
+# gunicorn), справочники отдаются асинхронными вьюхами.
+ASYNC_API = os.getenv('ASYNC_API') == 'True'
+
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '127.0.0.1').split(',')
 
 CSRF_TRUSTED_ORIGINS = [
@@ -37,10 +41,12 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
+    'tasks.apps.TasksConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,6 +83,14 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: воркер переиспользует соединение
+        # между запросами и проверяет его перед использованием.
+        # В ASGI-режиме постоянные соединения не используются.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0 if ASYNC_API else 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Для пулера в режиме transaction (PgBouncer) серверные курсоры
+        # нужно отключить.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS') == 'True',
     },
     'development': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -85,6 +99,45 @@ DATABASES = {
 }
 DATABASES['default'] = DATABASES['development'] if DEBUG else DATABASES['production']
 
+# Реплики для чтения: хосты PostgreSQL (host или host:port) в production
+# или файлы SQLite в режиме разработки, через запятую.
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    if DEBUG:
+        config = {**DATABASES['development'], 'NAME': BASE_DIR / replica}
+    else:
+        host, _, port = replica.partition(':')
+        config = {**DATABASES['production'], 'HOST': host, 'PORT': port or DATABASES['production']['PORT']}
+    config['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{number}'] = config
+    REPLICA_DATABASES.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['foodgram.db_routing.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает только с основной БД
+REPLICA_STICKINESS = int(os.getenv('DB_REPLICA_STICKINESS', 5))
+
+# Выполнять фоновые задачи сразу в процессе веб-приложения, а не
+# в воркере run_tasks. По умолчанию включено только для разработки.
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'True' if DEBUG else 'False') == 'True'
+
+# LocMemCache подходит только для разработки и одного процесса: версии
+# данных, которые сбрасывают воркер run_tasks и другие процессы
+# gunicorn, видны лишь через общий кеш (Redis, см. infra/).
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', LOCMEM_CACHE),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHES['default']['BACKEND'] == LOCMEM_CACHE:
+    # По умолчанию LocMemCache хранит 300 записей: кеш ответов и
+    # представлений рецептов вытеснял бы ключи версий и миниатюр
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    }
+
 PASSWORD_VALIDATION_USER = (
     'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'
 )
@@ -128,6 +181,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# TrueType-шрифт с кириллицей для PDF-выгрузки списка покупок;
+# по умолчанию — DejaVu Sans из репозитория
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    os.path.join(BASE_DIR, 'fonts', 'DejaVuSans.ttf')
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 
@@ -0,0 +1,22 @@
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:7000')
+# Несколько воркеров требуют общего кеша (CACHE_BACKEND), иначе версии
+# закешированных данных не будут согласованы между процессами.
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# При threads > 1 gunicorn использует gthread: каждый поток держит
+# свое постоянное соединение с БД (CONN_MAX_AGE).
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+if os.getenv('ASYNC_API') == 'True':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = os.getenv(
+        'GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker'
+    )
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
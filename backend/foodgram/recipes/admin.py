@@ -35,6 +35,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'cooking_time',
         'pub_date',
         'favorites_count',
+        'in_carts_count',
         'ingredients_list',
         'tags_list',
     )
@@ -43,10 +44,6 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = ('name',)
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description='Добавлено в избранное')
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
     @admin.display(description='Изображение')
     def image_tag(self, obj):
         return mark_safe(f'<img src="{obj.image.url}" width="80" height="60">')
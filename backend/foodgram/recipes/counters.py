@@ -0,0 +1,53 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counters(model, pk, **deltas):
+    """
+    Атомарно изменяет счетчики строки model на заданные величины.
+    Уменьшение не опускает счетчик ниже нуля: разошедшийся счетчик
+    (сырые удаления, строки до миграции) иначе нарушил бы ограничение
+    PositiveIntegerField, его исправляет команда recount.
+    """
+    model.objects.filter(pk=pk).update(**{
+        field: F(field) + delta if delta >= 0 else Greatest(
+            F(field) + delta, 0, output_field=model._meta.get_field(field)
+        )
+        for field, delta in deltas.items()
+    })
+
+
+def count_subquery(model, field):
+    """Подзапрос COUNT(*) строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+def recount_counters(apps=global_apps):
+    """
+    Пересчитывает все денормализованные счетчики одним UPDATE на
+    каждый счетчик. Принимает реестр моделей, чтобы работать и из
+    миграций.
+    """
+    recipe = apps.get_model('recipes', 'Recipe')
+    user = apps.get_model('users', 'User')
+    favorite = apps.get_model('recipes', 'Favorite')
+    shopping_list = apps.get_model('recipes', 'ShoppingList')
+    follow = apps.get_model('users', 'Follow')
+    recipe.objects.update(
+        favorites_count=count_subquery(favorite, 'recipe'),
+        in_carts_count=count_subquery(shopping_list, 'recipe'),
+    )
+    user.objects.update(
+        recipes_count=count_subquery(recipe, 'author'),
+        followers_count=count_subquery(follow, 'author'),
+    )
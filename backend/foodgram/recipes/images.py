@@ -0,0 +1,128 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from constants import (
+    RECIPE_IMAGE_MAX_SIZE,
+    RECIPE_IMAGE_QUALITY,
+    RECIPE_THUMBNAIL_SIZES
+)
+
+if features.check('webp'):
+    IMAGE_FORMAT, IMAGE_EXTENSION = 'WEBP', '.webp'
+else:
+    IMAGE_FORMAT, IMAGE_EXTENSION = 'JPEG', '.jpg'
+
+
+def open_image(file, size):
+    """
+    Открывает изображение, уменьшенное не больше чем до size по большей
+    стороне, с учетом ориентации из EXIF. Для JPEG уменьшение
+    выполняется еще при декодировании (draft), что намного быстрее.
+    """
+    image = Image.open(file)
+    image.draft('RGB', (size, size))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size), Image.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    if IMAGE_FORMAT == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    return image
+
+
+def encode_image(image):
+    """Пережимает изображение; метаданные (EXIF) не сохраняются."""
+    buffer = io.BytesIO()
+    image.save(buffer, IMAGE_FORMAT, quality=RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def process_image(file):
+    """
+    Приводит загруженное изображение к размеру не больше
+    RECIPE_IMAGE_MAX_SIZE и пережимает его в WebP (или JPEG).
+    """
+    name = os.path.splitext(os.path.basename(file.name))[0]
+    file.seek(0)
+    return ContentFile(
+        encode_image(open_image(file, RECIPE_IMAGE_MAX_SIZE)),
+        name=name + IMAGE_EXTENSION
+    )
+
+
+def thumbnail_name(name, size):
+    """Имя миниатюры однозначно выводится из имени изображения."""
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    return os.path.join(
+        directory,
+        'thumbnails',
+        f'{stem}_{extension.lstrip(".")}_{size}{IMAGE_EXTENSION}'
+    )
+
+
+def source_name(name):
+    """
+    Имя изображения, которому принадлежит файл: для миниатюры — имя
+    исходного изображения, для остальных файлов — само имя.
+    """
+    directory, filename = os.path.split(name)
+    if os.path.basename(directory) != 'thumbnails':
+        return name
+    parts = os.path.splitext(filename)[0].rsplit('_', 2)
+    if len(parts) != 3:
+        return name
+    stem, extension, _ = parts
+    filename = f'{stem}.{extension}' if extension else stem
+    return os.path.join(os.path.dirname(directory), filename)
+
+
+def make_thumbnails(name):
+    """Создает недостающие миниатюры изображения name в хранилище."""
+    missing = {
+        size: thumbnail_name(name, size)
+        for size in RECIPE_THUMBNAIL_SIZES.values()
+        if not default_storage.exists(thumbnail_name(name, size))
+    }
+    if not missing:
+        return
+    with default_storage.open(name) as file:
+        image = open_image(file, max(missing))
+        for size, path in sorted(missing.items(), reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            default_storage.save(path, ContentFile(encode_image(image)))
+
+
+def thumbnail_urls(recipe, request=None):
+    """
+    Адреса миниатюр рецепта по размерам. Пока миниатюры не созданы,
+    вместо них отдается исходное изображение.
+    """
+    if not recipe.image:
+        return None
+    names = {
+        label: (
+            thumbnail_name(recipe.image.name, size)
+            if recipe.has_thumbnails else recipe.image.name
+        )
+        for label, size in RECIPE_THUMBNAIL_SIZES.items()
+    }
+    urls = {label: default_storage.url(name) for label, name in names.items()}
+    if request is not None:
+        urls = {
+            label: request.build_absolute_uri(url)
+            for label, url in urls.items()
+        }
+    return urls
+
+
+def delete_image(name):
+    """Удаляет изображение вместе с его миниатюрами."""
+    for path in (name, *(
+        thumbnail_name(name, size) for size in RECIPE_THUMBNAIL_SIZES.values()
+    )):
+        default_storage.delete(path)
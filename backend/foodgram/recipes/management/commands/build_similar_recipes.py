@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from constants import SIMILAR_RECIPES_LIMIT
+from recipes.similarity import update_similar_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит списки похожих рецептов по TF-IDF ингредиентов и тегов. '
+        'По умолчанию пересчитываются только рецепты, измененные после '
+        'прошлого запуска, и списки, на которые они влияют.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help=(
+                'Пересчитать списки всех рецептов, например, чтобы '
+                'учесть изменившиеся веса IDF'
+            )
+        )
+        parser.add_argument(
+            '--limit', type=int, default=SIMILAR_RECIPES_LIMIT
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = update_similar_recipes(
+            options['limit'], options['batch_size'], full=options['full']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {updated} рецептов'
+        ))
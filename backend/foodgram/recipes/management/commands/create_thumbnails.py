@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.caching import bump_version
+from recipes.images import make_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры изображений рецептов, у которых их еще нет.'
+
+    def handle(self, *args, **options):
+        created = failed = 0
+        recipes = Recipe.objects.filter(has_thumbnails=False).exclude(image='')
+        for pk, image in recipes.values_list('pk', 'image').iterator():
+            try:
+                make_thumbnails(image)
+            except OSError:
+                failed += 1
+                continue
+            Recipe.objects.filter(pk=pk).update(
+                has_thumbnails=True, modified=timezone.now()
+            )
+            created += 1
+        if created:
+            # Закешированные ответы анонимам ссылаются на исходные
+            # изображения вместо миниатюр
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры созданы для {created} рецептов, ошибок: {failed}'
+        ))
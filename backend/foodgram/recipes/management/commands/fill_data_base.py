@@ -1,74 +1,171 @@
+import csv
 import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.caching import bump_version
 from recipes.models import Ingredient, Tag
 
+READ_CHUNK_SIZE = 64 * 1024
+
+TAGS_DATA = (
+    {
+        'name': 'Завтрак',
+        'color': '#FF0000',
+        'slug': 'zavtrak'
+    },
+    {
+        'name': 'Обед',
+        'color': '#00FF00',
+        'slug': 'obed'
+    },
+    {
+        'name': 'Ужин',
+        'color': '#0000FF',
+        'slug': 'uzhin'
+    },
+)
+
+
+def iter_json(file):
+    """
+    Потоково читает JSON-массив объектов, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise json.JSONDecodeError('Ожидался массив', buffer, 0)
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise json.JSONDecodeError('Неожиданный конец файла', buffer, 0)
+        chunk = file.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def iter_ingredients(file, file_format):
+    """Пары (name, measurement_unit) из JSON или CSV файла."""
+    if file_format == '.csv':
+        for row in csv.reader(file):
+            if row:
+                yield row[0].strip(), row[1].strip()
+    else:
+        for line in iter_json(file):
+            yield line['name'].strip(), line['measurement_unit'].strip()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class Command(BaseCommand):
-    def _create_data(self):
-        try:
-            with open('ingredients.json', 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                counter = 0
-                for line in data:
-                    name = line['name']
-                    measurement_unit = line['measurement_unit']
-                    ingredient, created = Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-                    if created:
-                        counter += 1
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                (f'Created Ingredient: {name},'
-                                 f' общее количество: {counter}')
-                            )
-                        )
-        except FileNotFoundError:
-            self.stdout.write(
-                self.style.ERROR(
-                    'Файл ingredients.json не существует'
-                )
-            )
-        except json.JSONDecodeError:
-            self.stdout.write(
-                self.style.ERROR(
-                    'Ошибка при чтении JSON файла'
+    help = (
+        'Загружает ингредиенты (JSON или CSV) и базовые теги. '
+        'Повторный запуск добавляет только недостающие записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='ingredients.json',
+            help='Файл с ингредиентами (.json или .csv)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать новые записи, ничего не сохраняя'
+        )
+
+    def _new_ingredients(self, path):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        self.total = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            for name, measurement_unit in iter_ingredients(
+                    file, path.suffix.lower()
+            ):
+                self.total += 1
+                if (name, measurement_unit) in existing:
+                    continue
+                existing.add((name, measurement_unit))
+                yield Ingredient(
+                    name=name,
+                    measurement_unit=measurement_unit
                 )
-            )
 
-    def _load_tags(self):
-        tags_data = [
-            {
-                'name': 'Завтрак',
-                'color': '#FF0000',
-                'slug': 'zavtrak'
-            },
-            {
-                'name': 'Обед',
-                'color': '#00FF00',
-                'slug': 'obed'
-            },
-            {
-                'name': 'Ужин',
-                'color': '#0000FF',
-                'slug': 'uzhin'
-            },
+    def _load_ingredients(self, path, batch_size, dry_run):
+        created = 0
+        for batch in batched(self._new_ingredients(path), batch_size):
+            if not dry_run:
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        return created
+
+    def _load_tags(self, dry_run):
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        tags = [
+            Tag(**tag_info) for tag_info in TAGS_DATA
+            if tag_info['slug'] not in existing
         ]
-        counter = 0
-        for tag_info in tags_data:
-            tag, created = Tag.objects.get_or_create(**tag_info)
-            if created:
-                counter += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        (f'Created Tag: {tag.name},'
-                         f' общее количество: {counter}')
-                    )
-                )
+        if tags and not dry_run:
+            Tag.objects.bulk_create(tags, ignore_conflicts=True)
+        return len(tags)
 
     def handle(self, *args, **options):
-        self._create_data()
-        self._load_tags()
+        path = Path(options['path'])
+        dry_run = options['dry_run']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        try:
+            with transaction.atomic():
+                ingredients_created = self._load_ingredients(
+                    path, options['batch_size'], dry_run
+                )
+                tags_created = self._load_tags(dry_run)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {path} не существует')
+        except (json.JSONDecodeError, KeyError, IndexError):
+            raise CommandError(f'Ошибка при чтении файла {path}')
+
+        if not dry_run:
+            bump_version('ingredients', 'tags')
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{prefix}Ингредиенты: прочитано {self.total}, '
+                f'новых {ingredients_created}, '
+                f'уже было {self.total - ingredients_created}. '
+                f'Новых тегов: {tags_created}.'
+            )
+        )
@@ -0,0 +1,106 @@
+import os
+import time
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import source_name
+from recipes.models import Recipe
+
+IMAGES_DIRECTORY = Recipe._meta.get_field('image').upload_to
+
+
+def walk_files(path):
+    """Потоково обходит файлы каталога, не собирая их в список."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и миниатюры, на которые не '
+        'ссылается ни один рецепт. Файлы и рецепты обрабатываются '
+        'пачками, без загрузки всех строк в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Не трогать файлы моложе указанного числа секунд: они '
+                'могут принадлежать еще не сохраненному рецепту'
+            )
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено'
+        )
+        parser.add_argument(
+            '--check-missing',
+            action='store_true',
+            help='Дополнительно найти рецепты, у которых нет файла'
+        )
+
+    def handle(self, *args, **options):
+        root = default_storage.path(IMAGES_DIRECTORY)
+        deleted = freed = 0
+        if os.path.isdir(root):
+            deadline = time.time() - options['grace']
+            files = (
+                entry for entry in walk_files(root)
+                if entry.stat().st_mtime < deadline
+            )
+            while batch := list(islice(files, options['batch_size'])):
+                deleted_batch, freed_batch = self.collect(
+                    batch, options['dry_run']
+                )
+                deleted += deleted_batch
+                freed += freed_batch
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Удалено файлов: {deleted}, '
+            f'освобождено {freed / 1024 / 1024:.1f} МБ'
+        ))
+        if options['check_missing']:
+            self.report_missing()
+
+    def collect(self, entries, dry_run):
+        """Удаляет из пачки файлы, которые не используются рецептами."""
+        names = {
+            entry: source_name(os.path.relpath(
+                entry.path, default_storage.location
+            ).replace(os.sep, '/'))
+            for entry in entries
+        }
+        used = set(Recipe.objects.filter(
+            image__in=set(names.values())
+        ).values_list('image', flat=True))
+        deleted = freed = 0
+        for entry, name in names.items():
+            if name in used:
+                continue
+            deleted += 1
+            freed += entry.stat().st_size
+            if not dry_run:
+                os.remove(entry.path)
+        return deleted, freed
+
+    def report_missing(self):
+        missing = 0
+        recipes = Recipe.objects.exclude(image='').values_list(
+            'pk', 'image'
+        )
+        for pk, name in recipes.iterator():
+            if not default_storage.exists(name):
+                missing += 1
+                self.stdout.write(f'Рецепт {pk}: нет файла {name}')
+        self.stdout.write(f'Рецептов без файла: {missing}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов.'
+
+    def handle(self, *args, **options):
+        index_recipes(Recipe)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс обновлен'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, списков покупок, '
+        'рецептов и подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_counters()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярности рецептов за последнее время.'
+
+    def handle(self, *args, **options):
+        updated = refresh_trending_scores()
+        self.stdout.write(
+            self.style.SUCCESS(f'Рейтинг обновлен для {updated} рецептов')
+        )
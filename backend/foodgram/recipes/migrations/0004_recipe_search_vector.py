@@ -0,0 +1,35 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:33
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.search import (
+    create_search_index,
+    drop_search_index,
+    index_recipes
+)
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor)
+    index_recipes(apps.get_model('recipes', 'Recipe'))
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+from recipes.counters import recount_counters
+
+
+def forwards(apps, schema_editor):
+    recount_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_pub_date_id_idx'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в списки покупок'),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='has_thumbnails',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры созданы'),
+        ),
+    ]
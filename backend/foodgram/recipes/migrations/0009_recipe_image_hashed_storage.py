@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:55
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_has_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.get_image_storage, upload_to='recipes/media', verbose_name='Изображение'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (
     MinValueValidator,
     MaxValueValidator, RegexValidator
@@ -17,6 +18,7 @@ from constants import (
     MAX_AMOUNT
 )
 
+from recipes.storage import get_image_storage
 from users.models import User
 
 
@@ -102,6 +104,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/media',
+        storage=get_image_storage,
         verbose_name='Изображение'
     )
     text = models.TextField(verbose_name='Текст')
@@ -132,11 +135,59 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлено в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлено в списки покупок'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг популярности за последнее время'
+    )
+    has_thumbnails = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Миниатюры созданы'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    similar_updated = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Похожие рецепты пересчитаны'
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-pub_date'],
+                name='recipe_trending_idx'
+            ),
+        ]
         constraints = [
             UniqueConstraint(
                 fields=['name', 'author'],
@@ -198,6 +249,41 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.measurement_unit})')
 
 
+class SimilarRecipe(models.Model):
+    """
+    Предрассчитанный похожий рецепт. Списки строит команда
+    build_similar_recipes, API читает их одним запросом по индексу.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+    rank = models.PositiveSmallIntegerField(verbose_name='Позиция')
+
+    class Meta:
+        ordering = ('recipe', 'rank')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'rank'],
+                name='unique_similar_recipe_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} похож на {self.similar_id}'
+
+
 class UserRecipe(models.Model):
     """
     Базовая модель рецепта, с общими
@@ -215,6 +301,10 @@ class UserRecipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         abstract = True
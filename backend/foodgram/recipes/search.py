@@ -0,0 +1,146 @@
+import re
+from functools import partial
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connections, router, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def create_search_index(schema_editor):
+    """Создает поисковый индекс для текущей СУБД."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_search_gin '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            'name, ingredients, text, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_search_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def index_recipes(recipe_model, recipe_ids=None):
+    """
+    Обновляет поисковый индекс для рецептов recipe_ids (или всех).
+    Принимает модель явно, чтобы работать и из миграций.
+    """
+    using = router.db_for_write(recipe_model)
+    connection = connections[using]
+    recipes = recipe_model.objects.using(using).order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+
+    if connection.vendor == 'postgresql':
+        # Один UPDATE на все рецепты: названия ингредиентов собирает
+        # подзапрос, а не цикл по рецептам в Python
+        recipe_ingredients = recipe_model._meta.get_field(
+            'recipe_ingredients'
+        ).related_model
+        ingredient_names = recipe_ingredients.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        recipes.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(ingredient_names), weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+    elif connection.vendor == 'sqlite':
+        documents = {
+            pk: (name, [], text)
+            for pk, name, text in recipes.values_list('id', 'name', 'text')
+        }
+        ingredients = recipes.filter(
+            recipe_ingredients__isnull=False
+        ).values_list('id', 'recipe_ingredients__ingredient__name')
+        for pk, ingredient_name in ingredients:
+            documents[pk][1].append(ingredient_name)
+        with connection.cursor() as cursor:
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            else:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [(pk,) for pk in recipe_ids]
+                )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'VALUES (%s, %s, %s, %s)',
+                [
+                    (pk, name, ' '.join(ingredient_names), text)
+                    for pk, (name, ingredient_names, text)
+                    in documents.items()
+                ]
+            )
+
+
+def schedule_index_update(recipe_ids):
+    """Обновляет индекс после фиксации текущей транзакции."""
+    from recipes.models import Recipe
+
+    transaction.on_commit(partial(index_recipes, Recipe, list(recipe_ids)))
+
+
+def search_recipes(queryset, query):
+    """
+    Фильтрует queryset по поисковому запросу (все слова, с поиском по
+    префиксу) и сортирует рецепты по релевантности: название важнее
+    ингредиентов, ингредиенты — текста.
+    """
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(
+            ' & '.join(f"'{term}':*" for term in terms),
+            config=SEARCH_CONFIG,
+            search_type='raw'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date')
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                (match,)
+            )
+        ).annotate(
+            rank=RawSQL(
+                f'SELECT bm25({FTS_TABLE}, 10.0, 4.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid = recipes_recipe.id',
+                (match,)
+            )
+        ).order_by('rank', '-pub_date')
+
+    for term in terms:
+        queryset = queryset.filter(name__icontains=term)
+    return queryset
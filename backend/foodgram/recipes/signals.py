@@ -0,0 +1,133 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+
+from constants import TRENDING_CART_WEIGHT, TRENDING_FAVORITE_WEIGHT
+from recipes.counters import change_counters
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList
+from recipes.search import schedule_index_update
+from recipes.tasks import delete_images, process_recipe_image
+from recipes.trending import event_weight, removed_event_weight
+from tasks.queue import enqueue
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipe_search_index(instance, **kwargs):
+    # Ингредиенты рецепта сохраняются в той же транзакции уже после
+    # самого рецепта (сериализатор, инлайны админки), поэтому индекс
+    # обновляется после фиксации транзакции.
+    schedule_index_update([instance.pk])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        instance.old_image = None
+    elif update_fields and 'image' not in update_fields:
+        instance.old_image = instance.image.name
+    else:
+        instance.old_image = Recipe.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_recipe_image(instance, **kwargs):
+    # Новое изображение обрабатывается в фоне, до этого отдается
+    # исходный файл.
+    if not instance.image or instance.image.name == instance.old_image:
+        return
+    if instance.has_thumbnails:
+        instance.has_thumbnails = False
+        Recipe.objects.filter(pk=instance.pk).update(has_thumbnails=False)
+    enqueue(
+        process_recipe_image,
+        recipe_id=instance.pk,
+        image=instance.image.name,
+        old_image=instance.old_image
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image(instance, **kwargs):
+    if instance.image:
+        enqueue(delete_images, names=[instance.image.name])
+
+
+@receiver(pre_delete, sender=Recipe)
+def expire_similar_recipes(instance, **kwargs):
+    # Удаление рецепта каскадно сокращает чужие списки похожих:
+    # такие рецепты пересчитает следующий запуск build_similar_recipes
+    Recipe.objects.filter(similar_recipes__similar=instance).update(
+        similar_updated=None
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_index(instance, created, **kwargs):
+    if not created:
+        schedule_index_update(
+            instance.recipe_ingredients.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counters(User, instance.author_id, recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counters(User, instance.author_id, recipes_count=-1)
+
+
+@receiver(post_save, sender=Favorite)
+def add_favorite(instance, created, **kwargs):
+    if created:
+        change_counters(
+            Recipe, instance.recipe_id,
+            favorites_count=1,
+            trending_score=event_weight(
+                instance.created, TRENDING_FAVORITE_WEIGHT
+            )
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def remove_favorite(instance, **kwargs):
+    change_counters(
+        Recipe, instance.recipe_id,
+        favorites_count=-1,
+        trending_score=-removed_event_weight(
+            instance.created, TRENDING_FAVORITE_WEIGHT
+        )
+    )
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        change_counters(
+            Recipe, instance.recipe_id,
+            in_carts_count=1,
+            trending_score=event_weight(
+                instance.created, TRENDING_CART_WEIGHT
+            )
+        )
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_from_shopping_list(instance, **kwargs):
+    change_counters(
+        Recipe, instance.recipe_id,
+        in_carts_count=-1,
+        trending_score=-removed_event_weight(
+            instance.created, TRENDING_CART_WEIGHT
+        )
+    )
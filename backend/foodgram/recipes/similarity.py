@@ -0,0 +1,234 @@
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from scipy import sparse
+
+from constants import (
+    SIMILAR_CHUNK_PAIRS,
+    SIMILAR_MAX_SHARE,
+    SIMILAR_MIN_PRUNED,
+    SIMILAR_TAG_WEIGHT
+)
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+Features = namedtuple(
+    'Features',
+    ('recipe_ids', 'ingredients', 'tag_sets', 'tag_similarity', 'scales')
+)
+
+
+def load_pairs(queryset, column):
+    """Пары (recipe_id, column) таблицы связей одним потоковым чтением."""
+    rows = queryset.order_by().values_list('recipe_id', column)
+    return np.fromiter(
+        chain.from_iterable(rows.iterator(chunk_size=10000)), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def positions(recipe_ids, pks):
+    """Номера строк матрицы для id рецептов; неизвестные id пропускаются."""
+    pks = np.fromiter(pks, dtype=np.int64)
+    rows = np.searchsorted(recipe_ids, pks)
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pks[known]
+    return rows[known], known
+
+
+def tf_idf(recipe_ids, pairs, max_share=None):
+    """
+    Бинарная матрица рецепт × признак с весами IDF. При max_share
+    отбрасываются признаки, которые есть у большей доли рецептов:
+    соль и вода почти не говорят о сходстве, но делают произведение
+    матриц почти плотным.
+    """
+    # Связи рецептов, созданных после чтения списка рецептов, пропускаются
+    rows, known = positions(recipe_ids, pairs[:, 0])
+    features, columns = np.unique(pairs[known, 1], return_inverse=True)
+    frequency = np.bincount(columns, minlength=len(features))
+    idf = np.log((1 + len(recipe_ids)) / (1 + frequency)) + 1
+    if max_share is not None:
+        limit = max(max_share * len(recipe_ids), SIMILAR_MIN_PRUNED)
+        idf[frequency > limit] = 0
+    return sparse.csr_matrix(
+        (idf[columns], (rows, columns)),
+        shape=(len(recipe_ids), len(features)),
+        dtype=np.float32
+    )
+
+
+def build_features():
+    """
+    Векторы рецептов: TF-IDF ингредиентов и тегов (с весом
+    SIMILAR_TAG_WEIGHT), нормированные так, что скалярное произведение
+    двух векторов — косинусное сходство рецептов. Ингредиенты хранятся
+    уже нормированными. Различных наборов тегов мало, поэтому вклад
+    тегов берется из таблицы сходства наборов и делится на нормы
+    векторов обоих рецептов (scales — обратные нормы).
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True).iterator(),
+        dtype=np.int64
+    )
+    ingredients = tf_idf(
+        recipe_ids,
+        load_pairs(RecipeIngredient.objects, 'ingredient_id'),
+        SIMILAR_MAX_SHARE
+    )
+    ingredients.eliminate_zeros()
+    tags = tf_idf(
+        recipe_ids, load_pairs(Recipe.tags.through.objects, 'tag_id')
+    ).toarray() * SIMILAR_TAG_WEIGHT
+    combinations, tag_sets = np.unique(tags, axis=0, return_inverse=True)
+    norms = np.sqrt(
+        np.asarray(ingredients.multiply(ingredients).sum(axis=1)).ravel()
+        + (tags ** 2).sum(axis=1)
+    )
+    norms[norms == 0] = 1
+    scales = (1 / norms).astype(np.float32)
+    return Features(
+        recipe_ids,
+        sparse.diags(scales).dot(ingredients).tocsr(),
+        tag_sets.ravel().astype(np.int32),
+        combinations.dot(combinations.T).astype(np.float32),
+        scales
+    )
+
+
+def chunks(features, rows, batch_size):
+    """
+    Делит строки на пачки не длиннее batch_size так, чтобы матрица
+    сходства пачки не превышала примерно SIMILAR_CHUNK_PAIRS ненулевых
+    элементов. Оценка сверху — сумма частот ингредиентов рецептов пачки.
+    """
+    binary = features.ingredients[rows].astype(bool).astype(np.float32)
+    frequency = np.asarray(
+        features.ingredients.astype(bool).sum(axis=0)
+    ).ravel()
+    cost = np.maximum(binary.dot(frequency), 1)
+    bounds = np.union1d(
+        np.searchsorted(
+            np.cumsum(cost),
+            np.arange(SIMILAR_CHUNK_PAIRS, cost.sum(), SIMILAR_CHUNK_PAIRS),
+            side='right'
+        ),
+        np.arange(batch_size, len(rows), batch_size)
+    )
+    return [chunk for chunk in np.split(rows, bounds) if len(chunk)]
+
+
+def similarity(features, transposed, rows):
+    """
+    Косинусное сходство рецептов rows со всеми рецептами, имеющими
+    общий ингредиент; сам с собой рецепт не сравнивается.
+    """
+    scores = features.ingredients[rows].dot(transposed).tocsr()
+    owners = np.repeat(rows, np.diff(scores.indptr))
+    scores.data += (
+        features.tag_similarity[
+            features.tag_sets[owners], features.tag_sets[scores.indices]
+        ]
+        * features.scales[owners]
+        * features.scales[scores.indices]
+    )
+    scores.data[scores.indices == owners] = 0
+    scores.eliminate_zeros()
+    return scores
+
+
+def top_neighbours(scores, limit):
+    """Для каждой строки — до limit столбцов с наибольшим сходством."""
+    for start, end in zip(scores.indptr[:-1], scores.indptr[1:]):
+        columns = scores.indices[start:end]
+        data = scores.data[start:end]
+        if len(data) > limit:
+            best = np.argpartition(-data, limit)[:limit]
+            columns, data = columns[best], data[best]
+        order = np.lexsort((columns, -data))
+        yield columns[order], data[order]
+
+
+def stored_thresholds(recipe_ids, limit):
+    """
+    Наименьшее сохраненное сходство для рецептов с полным списком
+    похожих: более далекие кандидаты их список не изменят.
+    """
+    thresholds = np.zeros(len(recipe_ids), dtype=np.float32)
+    stored = np.array(
+        SimilarRecipe.objects.order_by().values('recipe_id').annotate(
+            count=Count('pk'), threshold=Min('score')
+        ).filter(count__gte=limit).values_list('recipe_id', 'threshold'),
+        dtype=np.float64
+    ).reshape(-1, 2)
+    rows, known = positions(recipe_ids, stored[:, 0].astype(np.int64))
+    thresholds[rows] = stored[known, 1]
+    return thresholds
+
+
+def save_neighbours(features, rows, scores, limit, started):
+    recipe_ids = features.recipe_ids
+    pks = recipe_ids[rows].tolist()
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=pks).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(
+                recipe_id=recipe_id,
+                similar_id=int(recipe_ids[column]),
+                score=float(score),
+                rank=rank
+            )
+            for recipe_id, (columns, data) in zip(
+                pks, top_neighbours(scores, limit)
+            )
+            for rank, (column, score) in enumerate(zip(columns, data))
+        )
+        Recipe.objects.filter(pk__in=pks).update(similar_updated=started)
+
+
+def update_similar_recipes(limit, batch_size, full=False):
+    """
+    Пересчитывает списки похожих рецептов. Без full пересчитываются
+    только рецепты, измененные после прошлого расчета, и те, в чьи
+    списки они попадают или попадали. Возвращает число рецептов,
+    для которых списки пересчитаны.
+    """
+    started = timezone.now()
+    features = build_features()
+    transposed = features.ingredients.T.tocsr()
+    recipe_ids = features.recipe_ids
+    if full:
+        changed = np.arange(len(recipe_ids))
+    else:
+        stale = Recipe.objects.filter(
+            Q(similar_updated__isnull=True)
+            | Q(modified__gt=F('similar_updated'))
+        ).order_by('pk').values_list('pk', flat=True)
+        changed, _ = positions(recipe_ids, stale.iterator())
+    affected = np.zeros(len(recipe_ids), dtype=bool)
+    if not full and len(changed):
+        thresholds = stored_thresholds(recipe_ids, limit)
+        listing = SimilarRecipe.objects.filter(
+            similar_id__in=stale
+        ).values_list('recipe_id', flat=True)
+        affected[positions(recipe_ids, listing.iterator())[0]] = True
+    for rows in chunks(features, changed, batch_size):
+        scores = similarity(features, transposed, rows)
+        if not full:
+            # Сходство симметрично: столбцы пачки показывают, в чьи
+            # списки теперь попадают измененные рецепты
+            closest = scores.max(axis=0).toarray().ravel()
+            affected |= closest > thresholds
+        save_neighbours(features, rows, scores, limit, started)
+    affected[changed] = False
+    for rows in chunks(features, np.flatnonzero(affected), batch_size):
+        save_neighbours(
+            features,
+            rows,
+            similarity(features, transposed, rows),
+            limit,
+            started
+        )
+    return len(changed) + int(affected.sum())
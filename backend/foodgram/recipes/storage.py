@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Хранилище с адресацией по содержимому: файл называется по
+    SHA-256 своих данных. Одинаковые файлы хранятся один раз, а имя
+    файла никогда не меняет содержимого, поэтому их можно кешировать
+    без ограничения срока.
+    """
+
+    def hashed_name(self, name, content):
+        """Имя, под которым будет сохранено содержимое content."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+hashed_storage = HashedFileSystemStorage()
+
+
+def get_image_storage():
+    return hashed_storage
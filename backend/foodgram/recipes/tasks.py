@@ -0,0 +1,57 @@
+from django.utils import timezone
+
+from api.caching import bump_version_on_commit
+from recipes.images import delete_image, make_thumbnails, process_image
+from recipes.models import Recipe
+from tasks.queue import task
+
+
+def delete_unused_images(*names):
+    """
+    Удаляет изображения, на которые больше не ссылается ни один рецепт:
+    одинаковые загрузки хранятся в одном файле.
+    """
+    names = set(filter(None, names))
+    used = set(Recipe.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    for name in names - used:
+        delete_image(name)
+
+
+@task
+def process_recipe_image(recipe_id, image, old_image=None):
+    """
+    Пережимает загруженное изображение рецепта, создает миниатюры и
+    удаляет изображение, которое было до замены. Исходный файл остается
+    до запуска gc_media: его адрес вернул ответ на создание или
+    изменение рецепта, и клиенты могут еще обращаться к нему.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or recipe.image.name != image:
+        # Рецепт удален или изображение уже снова заменено: его
+        # обработает следующая задача.
+        delete_unused_images(image, old_image)
+        return
+    with recipe.image.storage.open(image) as file:
+        processed = process_image(file)
+    name = recipe.image.storage.save(
+        recipe.image.field.generate_filename(recipe, processed.name),
+        processed
+    )
+    make_thumbnails(name)
+    updated = Recipe.objects.filter(pk=recipe_id, image=image).update(
+        image=name,
+        has_thumbnails=True,
+        modified=timezone.now()
+    )
+    if not updated:
+        delete_unused_images(name)
+        return
+    bump_version_on_commit('recipes')
+    delete_unused_images(old_image)
+
+
+@task
+def delete_images(names):
+    delete_unused_images(*names)
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.db.models import (
+    Exists,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum
+)
+from django.db.models.functions import Coalesce, Power
+from django.utils import timezone
+
+from constants import (
+    TRENDING_CART_WEIGHT,
+    TRENDING_EPOCH,
+    TRENDING_FAVORITE_WEIGHT,
+    TRENDING_HALF_LIFE,
+    TRENDING_WINDOW
+)
+from recipes.models import Favorite, Recipe, ShoppingList
+
+TRENDING_EVENTS = (
+    (Favorite, TRENDING_FAVORITE_WEIGHT),
+    (ShoppingList, TRENDING_CART_WEIGHT),
+)
+
+
+class EpochSeconds(Func):
+    """Момент времени в секундах unix time (с дробной частью)."""
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template='EXTRACT(EPOCH FROM %(expressions)s)::double precision',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+            **extra_context
+        )
+
+
+def event_weight(created, weight):
+    """Вклад события в trending_score рецепта."""
+    return weight * 2 ** (
+        (created.timestamp() - TRENDING_EPOCH) / TRENDING_HALF_LIFE
+    )
+
+
+def trending_since():
+    return timezone.now() - timedelta(seconds=TRENDING_WINDOW)
+
+
+def removed_event_weight(created, weight):
+    """
+    Вклад удаляемого события. События старше TRENDING_WINDOW
+    refresh_trending_scores уже исключил из trending_score, вычитать
+    их нельзя.
+    """
+    if created < trending_since():
+        return 0
+    return event_weight(created, weight)
+
+
+def events_score(model, weight, since):
+    """Подзапрос: сумма вкладов событий model рецепта начиная с since."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                recipe=OuterRef('pk'), created__gte=since
+            ).order_by().values('recipe').annotate(
+                score=Sum(weight * Power(
+                    2,
+                    (EpochSeconds('created') - TRENDING_EPOCH)
+                    / TRENDING_HALF_LIFE
+                ))
+            ).values('score')
+        ),
+        0.0,
+        output_field=FloatField()
+    )
+
+
+def refresh_trending_scores():
+    """
+    Пересчитывает trending_score по событиям за TRENDING_WINDOW,
+    отбрасывая накопленные погрешности и события старше окна. Счет
+    считается и записывается одним UPDATE: приращения из сигналов,
+    зафиксированные до него, входят в сумму событий, а не затираются
+    ранее прочитанным значением. Возвращает число обновленных рецептов.
+    """
+    since = trending_since()
+    recent = Q()
+    for model, _ in TRENDING_EVENTS:
+        recent |= Exists(
+            model.objects.filter(recipe=OuterRef('pk'), created__gte=since)
+        )
+    return Recipe.objects.filter(
+        ~Q(trending_score=0) | recent
+    ).update(trending_score=sum(
+        events_score(model, weight, since)
+        for model, weight in TRENDING_EVENTS
+    ))
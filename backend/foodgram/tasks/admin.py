@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from tasks.models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.queue import claim, run_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди фоновых задач. На PostgreSQL можно запускать '
+        'несколько воркеров одновременно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач забирать за один раз'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                tasks = claim(limit=options['batch_size'])
+                succeeded = run_tasks(tasks)
+                done += succeeded
+                failed += len(tasks) - succeeded
+                if not tasks:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'
+        ))
@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+from constants import MAX_LENGTH_TASK_NAME
+
+
+class Task(models.Model):
+    """Модель фоновой задачи в очереди"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=MAX_LENGTH_TASK_NAME,
+        verbose_name='Задача'
+    )
+    payload = models.JSONField(
+        default=dict,
+        verbose_name='Аргументы'
+    )
+    status = models.CharField(
+        max_length=max(len(status) for status, _ in STATUSES),
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запустить не раньше'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        ordering = ('run_at',)
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=('status', 'run_at'),
+                name='task_status_run_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
@@ -0,0 +1,89 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from constants import TASK_LEASE, TASK_MAX_ATTEMPTS, TASK_RETRY_DELAY
+from tasks.models import Task
+
+registry = {}
+
+
+def task(func):
+    """Регистрирует функцию как фоновую задачу."""
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    registry[func.task_name] = func
+    return func
+
+
+def enqueue(func, **payload):
+    """
+    Ставит задачу в очередь. Строка задачи пишется в текущей транзакции,
+    поэтому воркер увидит ее только вместе с данными, которые ее
+    породили. При TASKS_EAGER задача выполняется в этом же процессе
+    после фиксации транзакции.
+    """
+    queued = Task.objects.create(name=func.task_name, payload=payload)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_tasks(claim(pk=queued.pk)))
+    return queued
+
+
+def claim(limit=1, pk=None):
+    """
+    Забирает задачи, готовые к выполнению: ожидающие и те, чья аренда
+    истекла (воркер упал). На время выполнения run_at сдвигается на
+    TASK_LEASE. На PostgreSQL строки, уже забранные другим воркером,
+    пропускаются (SKIP LOCKED).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Task.objects.select_for_update(skip_locked=True).filter(
+            status__in=(Task.PENDING, Task.RUNNING), run_at__lte=now
+        )
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        tasks = list(queryset.order_by('run_at')[:limit])
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=TASK_LEASE)
+        )
+    for claimed in tasks:
+        claimed.attempts += 1
+    return tasks
+
+
+def run_task(queued):
+    """
+    Выполняет задачу. Успешная задача удаляется из очереди, упавшая
+    повторяется с экспоненциальной задержкой, после TASK_MAX_ATTEMPTS
+    попыток остается в статусе FAILED.
+    """
+    func = registry.get(queued.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {queued.name} не зарегистрирована')
+        with transaction.atomic():
+            func(**queued.payload)
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        if func is None or queued.attempts >= TASK_MAX_ATTEMPTS:
+            queued.status = Task.FAILED
+        else:
+            queued.status = Task.PENDING
+            queued.run_at = timezone.now() + timedelta(
+                seconds=TASK_RETRY_DELAY * 2 ** (queued.attempts - 1)
+            )
+        queued.save(update_fields=('status', 'run_at', 'last_error'))
+        return False
+    queued.delete()
+    return True
+
+
+def run_tasks(tasks):
+    """Выполняет задачи и возвращает число успешных."""
+    return sum(run_task(queued) for queued in tasks)
@@ -34,6 +34,16 @@ class User(AbstractUser):
         max_length=MAX_LENGTH_USER_FIELD,
         verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во подписчиков'
+    )
 
     class Meta:
         ordering = ('username',)